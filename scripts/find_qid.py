@@ -1,7 +1,9 @@
 from typing import Optional, Dict
-from functools import lru_cache
 import requests, time
 
+from memo import memoize
+from profiling import network_wait
+
 # Base endpoint of the MediaWiki API (Wikidata)
 API_ENDPOINT = "https://www.wikidata.org/w/api.php"
 
@@ -14,6 +16,10 @@ MAX_RETRIES = 3
 # Wait time in seconds between retry attempts (backoff time)
 BACKOFF_SECS = 3
 
+# Bounds of the lookup caches: number of entries and lifetime in seconds
+CACHE_SIZE = 4096
+CACHE_TTL = 24 * 3600
+
 """
 Performs a GET request to the Wikidata API with error handling and automatic retries.
 """
@@ -21,8 +27,9 @@ Performs a GET request to the Wikidata API with error handling and automatic ret
 def _api_get(params: Dict) -> Dict:  # API
     for attempt in range(1, MAX_RETRIES + 1):
         try:
-            # Perform GET request with headers and timeout
-            r = requests.get(API_ENDPOINT, params=params, headers=HEADERS, timeout=25)
+            # Perform GET request with headers and timeout (reported as network wait when profiling)
+            with network_wait():
+                r = requests.get(API_ENDPOINT, params=params, headers=HEADERS, timeout=25)
 
             # Raise exception on HTTP errors (e.g., 403, 500)
             r.raise_for_status()
@@ -47,8 +54,8 @@ def _api_get(params: Dict) -> Dict:  # API
 Finds the Wikidata QID for a given ORCID ID using the 'haswbstatement' search function.
 """
 
-# Enable caching to avoid duplicate API requests
-@lru_cache(maxsize=None)
+# Enable caching to avoid duplicate API requests (concurrent calls for the same ORCID share one request)
+@memoize(maxsize=CACHE_SIZE, ttl=CACHE_TTL)
 def find_qid_by_orcid(orcid: str) -> Optional[str]:
     # Immediately abort on empty input
     if not orcid:
@@ -57,4 +64,19 @@ def find_qid_by_orcid(orcid: str) -> Optional[str]:
     query = f'haswbstatement:P496="{orcid}"'
 
     # Send request to the Wikidata API
-    data =
+    data = _api_get(
+        {
+            "action": "query",
+            "list": "search",
+            "srsearch": query,
+            "srlimit": 1,
+            "format": "json"
+        }
+    )
+    try:
+        # Extract QID from the first search result (e.g., "Q12345")
+        return data["query"]["search"][0]["title"]
+    except (KeyError, IndexError):
+        # No result found or unexpected response → return None
+        return None
+
@@ -0,0 +1,160 @@
+#%%
+# Shared memoization for lookup functions (Wikidata QIDs, institutions, …).
+# Bounded (LRU), optional TTL, safe for threads and asyncio, with single-flight semantics:
+# concurrent callers asking for the same key wait for one outstanding request instead of sending their own.
+
+import asyncio, functools, inspect, threading, time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Optional, Tuple
+#%%
+"""
+Thread-safe LRU/TTL cache with single-flight loading and hit/miss/coalesced counters.
+"""
+
+class SingleFlightCache:
+    def __init__(self, maxsize: Optional[int] = 1024, ttl: Optional[float] = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._lock = threading.Lock()
+
+        # key → (expires_at or None, value), most recently used last
+        self._values: "OrderedDict[Any, Tuple[Optional[float], Any]]" = OrderedDict()
+
+        # key → Future of the request that is currently running for this key
+        self._inflight: Dict[Any, Future] = {}
+        self.hits = self.misses = self.coalesced = 0
+
+    # Returns (True, value) for a valid cached entry; expired entries are dropped (caller holds the lock)
+    def _lookup(self, key) -> Tuple[bool, Any]:
+        entry = self._values.get(key)
+        if entry is None:
+            return False, None
+        expires, value = entry
+        if expires is not None and expires <= time.monotonic():
+            del self._values[key]
+            return False, None
+        self._values.move_to_end(key)
+        return True, value
+
+    # Stores a value and evicts the least recently used entries (caller holds the lock)
+    def _store(self, key, value):
+        expires = time.monotonic() + self.ttl if self.ttl is not None else None
+        self._values[key] = (expires, value)
+        self._values.move_to_end(key)
+        if self.maxsize is not None:
+            while len(self._values) > self.maxsize:
+                self._values.popitem(last=False)
+
+    # Registers a lookup: returns (found, value, future, leader); the leader must load and call _finish
+    def _begin(self, key):
+        with self._lock:
+            found, value = self._lookup(key)
+            if found:
+                self.hits += 1
+                return True, value, None, False
+            future = self._inflight.get(key)
+            if future is not None:
+                self.coalesced += 1
+                return False, None, future, False
+            self.misses += 1
+            future = self._inflight[key] = Future()
+            # Marks the shared future as running, so a cancelled waiter cannot cancel it for everyone
+            future.set_running_or_notify_cancel()
+            return False, None, future, True
+
+    # Publishes the leader's result (or exception) to all waiting callers; exceptions are not cached.
+    # A load detached by clear() still answers its callers, but its value is not stored.
+    def _finish(self, key, future: Future, value=None, exc: Optional[BaseException] = None):
+        with self._lock:
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+                if exc is None:
+                    self._store(key, value)
+        if exc is None:
+            future.set_result(value)
+        else:
+            future.set_exception(exc)
+
+    """
+    Returns the cached value for `key` or computes it with `load()`.
+    If another thread is already loading the key, waits for its result.
+    """
+
+    def get(self, key, load: Callable[[], Any]):
+        found, value, future, leader = self._begin(key)
+        if found:
+            return value
+        if not leader:
+            return future.result()
+        try:
+            value = load()
+        except BaseException as exc:
+            self._finish(key, future, exc=exc)
+            raise
+        self._finish(key, future, value)
+        return value
+
+    """
+    Async variant of `get`: `load()` returns an awaitable. Waiting callers do not block the event loop,
+    and coalescing also works across threads and event loops (the shared future is wrapped per loop).
+    A cancelled waiter (e.g. an `asyncio.wait_for` timeout) only stops waiting; the shared request continues.
+    """
+
+    async def get_async(self, key, load: Callable[[], Any]):
+        found, value, future, leader = self._begin(key)
+        if found:
+            return value
+        if not leader:
+            return await asyncio.wrap_future(future)
+        try:
+            value = await load()
+        except BaseException as exc:
+            self._finish(key, future, exc=exc)
+            raise
+        self._finish(key, future, value)
+        return value
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "coalesced": self.coalesced,
+                    "size": len(self._values), "inflight": len(self._inflight)}
+
+    # Drops all values and detaches running loads, so their (possibly stale) results are not cached
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+            self._inflight = {}
+            self.hits = self.misses = self.coalesced = 0
+#%%
+"""
+Decorator that memoizes a lookup function with a `SingleFlightCache`.
+Works for plain and `async def` functions; arguments must be hashable.
+The wrapper exposes `cache`, `cache_stats()` and `cache_clear()`.
+
+    @memoize(maxsize=4096, ttl=24 * 3600)
+    def find_qid_by_orcid(orcid): ...
+"""
+
+def memoize(maxsize: Optional[int] = 1024, ttl: Optional[float] = None):
+    def decorator(func):
+        cache = SingleFlightCache(maxsize, ttl)
+
+        def make_key(args, kwargs):
+            return (args, tuple(sorted(kwargs.items()))) if kwargs else args
+
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def wrapper(*args, **kwargs):
+                return await cache.get_async(make_key(args, kwargs), lambda: func(*args, **kwargs))
+        else:
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                return cache.get(make_key(args, kwargs), lambda: func(*args, **kwargs))
+
+        wrapper.cache = cache
+        wrapper.cache_stats = cache.stats
+        wrapper.cache_clear = cache.clear
+        return wrapper
+
+    return decorator
@@ -0,0 +1,164 @@
+#%%
+# On-disk cache of ORCID profile sections with conditional revalidation.
+# Each section (educations, works, …) is stored gzip-compressed together with its ETag, the HTTP
+# Last-Modified header and the record's own "last-modified-date". Refreshes send If-None-Match /
+# If-Modified-Since, and sections whose content did not change are neither re-downloaded (304) nor re-mapped:
+# the mapped facts are stored next to the payload, keyed by the record's "last-modified-date".
+
+import gzip, json, logging, pickle, time
+from pathlib import Path
+from typing import Callable, List, Optional, Tuple
+
+import orjson, requests
+
+from profiling import network_wait
+
+# HTTP header to specify the desired response format (JSON)
+HEADERS = {"Accept": "application/json"}
+
+# Version of the stored facts; bump it when an extractor changes, so facts stored by earlier runs are mapped again
+# (2: works are no longer cut to five at fetch time)
+FACTS_VERSION = 2
+#%%
+"""
+Returns the record's own modification timestamp (`last-modified-date.value`, ms since epoch) of a section payload.
+"""
+
+def _record_modified(payload: dict) -> Optional[int]:
+    node = payload.get("last-modified-date") if isinstance(payload, dict) else None
+    return node.get("value") if isinstance(node, dict) else None
+#%%
+"""
+Cache directory layout: `<directory>/<orcid>/<section>.json.gz` (payload), `<section>.meta.json`
+(etag, last_modified, record_modified, fetched) and `<section>.facts.pkl.gz` ((FACTS_VERSION, record_modified), mapped facts).
+"""
+
+class ProfileCache:
+    def __init__(self, directory):
+        self.directory = Path(directory)
+
+        # Counters for the end-of-run summary
+        self.stats = {"not_modified": 0, "unchanged": 0, "changed": 0, "failed": 0}
+
+    def _paths(self, orcid: str, section: str) -> Tuple[Path, Path]:
+        folder = self.directory / orcid
+        return folder / f"{section}.json.gz", folder / f"{section}.meta.json"
+
+    def _load(self, orcid: str, section: str) -> Tuple[dict, Optional[dict]]:
+        payload_path, meta_path = self._paths(orcid, section)
+        if not (payload_path.exists() and meta_path.exists()):
+            return {}, None
+        try:
+            meta = json.loads(meta_path.read_text(encoding="utf-8"))
+            payload = orjson.loads(gzip.decompress(payload_path.read_bytes()))
+        except (OSError, ValueError) as exc:
+            # A damaged cache entry is treated as missing and fetched again
+            logging.warning("Ignoring damaged cache entry %s/%s: %s", orcid, section, exc)
+            return {}, None
+        return meta, payload
+
+    def _store(self, orcid: str, section: str, payload: dict, resp: requests.Response):
+        payload_path, meta_path = self._paths(orcid, section)
+        payload_path.parent.mkdir(parents=True, exist_ok=True)
+        payload_path.write_bytes(gzip.compress(orjson.dumps(payload)))
+        self._store_meta(orcid, section, {"record_modified": _record_modified(payload)}, resp)
+
+    # Writes meta.json with the validators of `resp`; the payload file is left untouched
+    def _store_meta(self, orcid: str, section: str, meta: dict, resp: requests.Response):
+        meta = {
+            "etag": resp.headers.get("ETag"),
+            "last_modified": resp.headers.get("Last-Modified"),
+            "record_modified": meta.get("record_modified"),
+            "fetched": int(time.time()),
+        }
+        self._paths(orcid, section)[1].write_text(json.dumps(meta), encoding="utf-8")
+
+    def _facts_path(self, orcid: str, section: str) -> Path:
+        return self.directory / orcid / f"{section}.facts.pkl.gz"
+
+    # Returns the stored facts if they were mapped from the record version `modified` by the current extractors, else None
+    def _load_facts(self, orcid: str, section: str, modified: Optional[int]) -> Optional[List]:
+        path = self._facts_path(orcid, section)
+        if not path.exists():
+            return None
+        try:
+            stored_key, facts = pickle.loads(gzip.decompress(path.read_bytes()))
+        except Exception as exc:
+            # Damaged entries or facts of changed record classes are mapped again
+            logging.warning("Ignoring stored facts %s/%s: %s", orcid, section, exc)
+            return None
+        return facts if stored_key == (FACTS_VERSION, modified) else None
+
+    def _store_facts(self, orcid: str, section: str, modified: Optional[int], facts: List):
+        path = self._facts_path(orcid, section)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(gzip.compress(pickle.dumps(((FACTS_VERSION, modified), facts), protocol=pickle.HIGHEST_PROTOCOL)))
+
+    """
+    Returns the section payload and whether its content changed since it was cached.
+    A conditional request is sent if the section is cached; on 304 the cached payload is used.
+    If ORCID cannot be reached, the cached payload (if any) is returned unchanged.
+    """
+
+    def fetch(self, orcid: str, section: str, url: str) -> Tuple[Optional[dict], bool]:
+        meta, cached = self._load(orcid, section)
+
+        # Conditional headers from the previous response
+        headers = dict(HEADERS)
+        if cached is not None:
+            if meta.get("etag"):
+                headers["If-None-Match"] = meta["etag"]
+            if meta.get("last_modified"):
+                headers["If-Modified-Since"] = meta["last_modified"]
+
+        try:
+            with network_wait():
+                resp = requests.get(url, headers=headers, timeout=20)
+        except requests.exceptions.RequestException as exc:
+            logging.warning("ORCID call failed for %s/%s: %s", orcid, section, exc)
+            self.stats["failed"] += 1
+            return cached, False
+
+        # Not modified → nothing downloaded, cached payload is still valid
+        if resp.status_code == 304 and cached is not None:
+            self.stats["not_modified"] += 1
+            return cached, False
+
+        if not resp.ok:
+            self.stats["failed"] += 1
+            return cached, False
+
+        payload = orjson.loads(resp.content)
+
+        # Server ignored the conditional headers, but the record itself did not change;
+        # only the new validators are kept so the next request can be answered with 304
+        if cached is not None and _record_modified(payload) is not None \
+                and _record_modified(payload) == meta.get("record_modified"):
+            self._store_meta(orcid, section, meta, resp)
+            self.stats["unchanged"] += 1
+            return cached, False
+
+        self._store(orcid, section, payload, resp)
+        self.stats["changed"] += 1
+        return payload, True
+
+    """
+    Fetches a section and maps it with `extract` (payload → list of facts).
+    For unchanged sections the facts stored by an earlier run (same record version) are returned without mapping.
+    `extract` must be deterministic per section; bump `FACTS_VERSION` after changing an extractor.
+    """
+
+    def section(self, orcid: str, section: str, url: str, extract: Callable[[dict], List]) -> List:
+        payload, changed = self.fetch(orcid, section, url)
+        if payload is None:
+            return []
+
+        modified = _record_modified(payload)
+        if not changed:
+            facts = self._load_facts(orcid, section, modified)
+            if facts is not None:
+                return facts
+
+        facts = extract(payload)
+        self._store_facts(orcid, section, modified, facts)
+        return facts
@@ -0,0 +1,212 @@
+#%%
+# Offline ORCID search backed by the annual ORCID public data file.
+# The summaries archive (tar.gz of one XML file per record) is stream-parsed with bounded memory into a
+# local SQLite index of normalized given/family name tokens and affiliation organizations → ORCID iDs.
+#
+# Usage:
+#   python orcid_index.py ORCID_2024_10_summaries.tar.gz ../import/orcid_index.sqlite --dump-date 2024-10-01
+
+import argparse, logging, re, sqlite3, sys, tarfile, unicodedata
+import xml.etree.ElementTree as ET
+from pathlib import Path
+from typing import Iterator, List, Optional, Tuple
+
+# Number of records written per SQLite transaction while indexing
+BATCH_SIZE = 5000
+
+# An ORCID iD as it appears in the record file names
+ORCID_RE = re.compile(r"\d{4}-\d{4}-\d{4}-\d{3}[\dX]")
+
+# Affiliation sections whose organizations are indexed
+AFFILIATION_SUMMARIES = {
+    "employment-summary", "education-summary", "qualification-summary",
+    "invited-position-summary", "membership-summary", "service-summary", "distinction-summary",
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE IF NOT EXISTS person (orcid TEXT PRIMARY KEY, given TEXT, family TEXT, last_modified TEXT);
+CREATE TABLE IF NOT EXISTS affiliation (orcid TEXT, org TEXT, PRIMARY KEY (orcid, org)) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS name_token (kind TEXT, token TEXT, orcid TEXT, PRIMARY KEY (kind, token, orcid)) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS affiliation_org ON affiliation (org);
+CREATE INDEX IF NOT EXISTS name_token_orcid ON name_token (orcid);
+"""
+
+# Token kinds in `name_token`: given-names and family-name
+GIVEN, FAMILY = "g", "f"
+#%%
+"""
+Normalizes a name or organization for matching: accents removed, case-folded, punctuation and repeated
+whitespace collapsed. "Förstner, K." and "forstner k" are normalized to the same value.
+"""
+
+def normalize(text: Optional[str]) -> str:
+    if not text:
+        return ""
+    text = unicodedata.normalize("NFKD", str(text))
+    text = "".join(c for c in text if not unicodedata.combining(c)).casefold()
+    return " ".join(re.sub(r"[^\w]+", " ", text).split())
+
+
+# Distinct tokens of a normalized name ("Anna-Maria" → ["anna", "maria"])
+def _tokens(text: Optional[str]) -> List[str]:
+    return sorted(set(normalize(text).split()))
+
+
+# Strips the XML namespace from an element tag ("{http://…}given-names" → "given-names")
+def _local(tag: str) -> str:
+    return tag.rsplit("}", 1)[-1]
+#%%
+"""
+Parses one record XML (file object) incrementally and returns (given, family, last_modified, organizations).
+Elements are cleared as soon as they are processed, so large records do not stay in memory.
+"""
+
+def parse_record(fileobj) -> Tuple[str, str, str, List[str]]:
+    given = family = last_modified = ""
+    orgs: List[str] = []
+    stack: List[str] = []
+
+    for event, elem in ET.iterparse(fileobj, events=("start", "end")):
+        tag = _local(elem.tag)
+        if event == "start":
+            stack.append(tag)
+            continue
+
+        stack.pop()
+        parent = stack[-1] if stack else ""
+        if tag == "given-names" and parent == "name":
+            given = elem.text or ""
+        elif tag == "family-name" and parent == "name":
+            family = elem.text or ""
+        elif tag == "last-modified-date" and parent == "history":
+            last_modified = (elem.text or "")[:10]
+        elif tag == "name" and parent == "organization" and len(stack) >= 2 and stack[-2] in AFFILIATION_SUMMARIES:
+            if elem.text:
+                orgs.append(elem.text)
+        elem.clear()
+
+    return given, family, last_modified, orgs
+
+
+"""
+Streams all records of the public data file. The archive is read sequentially ("r|gz"),
+so neither the archive nor its member list is ever held in memory.
+"""
+
+def iter_dump(dump_path) -> Iterator[Tuple[str, str, str, str, List[str]]]:
+    with tarfile.open(dump_path, mode="r|gz") as tar:
+        for member in tar:
+            if not member.isfile() or not member.name.endswith(".xml"):
+                continue
+            match = ORCID_RE.search(Path(member.name).name)
+            if not match:
+                continue
+            try:
+                given, family, last_modified, orgs = parse_record(tar.extractfile(member))
+            except ET.ParseError as exc:
+                logging.warning("Skipping unreadable record %s: %s", member.name, exc)
+                continue
+            yield match.group(0), given, family, last_modified, orgs
+#%%
+"""
+Builds (or updates) the local index from the public data file and records the dump date.
+Records already in the index are replaced, so a newer dump can be applied on top of an older one.
+"""
+
+def build_index(dump_path, index_path, dump_date: str) -> int:
+    con = sqlite3.connect(index_path)
+    con.executescript(SCHEMA)
+    count = 0
+
+    try:
+        for orcid, given, family, last_modified, orgs in iter_dump(dump_path):
+            con.execute("INSERT OR REPLACE INTO person VALUES (?, ?, ?, ?)",
+                        (orcid, normalize(given), normalize(family), last_modified))
+            con.execute("DELETE FROM affiliation WHERE orcid = ?", (orcid,))
+            con.executemany("INSERT OR IGNORE INTO affiliation VALUES (?, ?)",
+                            ((orcid, normalize(org)) for org in set(orgs) if normalize(org)))
+            con.execute("DELETE FROM name_token WHERE orcid = ?", (orcid,))
+            con.executemany("INSERT OR IGNORE INTO name_token VALUES (?, ?, ?)",
+                            [(GIVEN, token, orcid) for token in _tokens(given)]
+                            + [(FAMILY, token, orcid) for token in _tokens(family)])
+            count += 1
+
+            # Commit in batches to bound the size of the pending transaction
+            if count % BATCH_SIZE == 0:
+                con.commit()
+                logging.info("… %s records indexed", count)
+
+        con.execute("INSERT OR REPLACE INTO meta VALUES ('dump_date', ?)", (dump_date,))
+        con.commit()
+    finally:
+        con.close()
+
+    logging.info("✅  Indexed %s records → %s", count, index_path)
+    return count
+#%%
+"""
+Read-only access to a local ORCID index, used as a search backend by `search_orcid.orcid_search`.
+"""
+
+class OrcidIndex:
+    def __init__(self, index_path):
+        self.path = Path(index_path)
+        self._con = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True, check_same_thread=False)
+        if not self._con.execute("SELECT 1 FROM sqlite_master WHERE name = 'name_token'").fetchone():
+            self._con.close()
+            raise ValueError(f"{self.path} has no name tokens; rebuild it with orcid_index.py")
+        row = self._con.execute("SELECT value FROM meta WHERE key = 'dump_date'").fetchone()
+
+        # Date of the public data file (YYYY-MM-DD); records changed afterwards are only found live
+        self.dump_date: Optional[str] = row[0] if row else None
+
+    """
+    Returns up to `limit` candidate ORCID iDs for a given/family name, optionally restricted to an affiliation organization.
+    Matching is token-based and at least as loose as the live search: a record matches if its given names contain the
+    first given token and its family name contains any of the family tokens. So "Konrad Förstner" finds "Konrad U."
+    Förstner, and family "Maria Schmidt" (a middle name split off as family name) finds "Schmidt".
+    """
+
+    def candidates(self, given: str, family: str, org: Optional[str] = None, limit: int = 2) -> List[str]:
+        given_tokens, family_tokens = normalize(given).split(), _tokens(family)
+        if not family_tokens:
+            return []
+
+        sql = ("SELECT DISTINCT f.orcid FROM name_token f "
+               f"WHERE f.kind = ? AND f.token IN ({', '.join('?' * len(family_tokens))})")
+        params: list = [FAMILY, *family_tokens]
+        if given_tokens:
+            sql += " AND EXISTS (SELECT 1 FROM name_token g WHERE g.orcid = f.orcid AND g.kind = ? AND g.token = ?)"
+            params += [GIVEN, given_tokens[0]]
+        if org:
+            sql += " AND EXISTS (SELECT 1 FROM affiliation a WHERE a.orcid = f.orcid AND a.org = ?)"
+            params.append(normalize(org))
+        rows = self._con.execute(sql + " LIMIT ?", (*params, limit)).fetchall()
+        return [row[0] for row in rows]
+
+    """
+    Returns the ORCID iD for a given/family name, optionally restricted to an affiliation organization.
+    Only unambiguous matches are returned; `None` if there is no or more than one candidate.
+    """
+
+    def search(self, given: str, family: str, org: Optional[str] = None) -> Optional[str]:
+        found = self.candidates(given, family, org)
+        return found[0] if len(found) == 1 else None
+
+    def close(self):
+        self._con.close()
+#%%
+if __name__ == "__main__":
+
+    # Configure logging format and level
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
+
+    # Parse command-line arguments
+    parser = argparse.ArgumentParser(description="Build a local ORCID search index from the public data file")
+    parser.add_argument("dump", help="ORCID public data file (summaries .tar.gz)")
+    parser.add_argument("index", help="SQLite index file to create or update")
+    parser.add_argument("--dump-date", required=True, help="Date of the data file (YYYY-MM-DD)")
+    args = parser.parse_args(sys.argv[1:])
+
+    build_index(args.dump, args.index, args.dump_date)
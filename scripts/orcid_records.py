@@ -0,0 +1,204 @@
+#%%
+# Compact record layer for researchers and the ORCID facts that are mapped to Wikidata.
+# Every class uses __slots__ so a profile keeps only the handful of fields the QS mapping needs
+# instead of the complete nested ORCID JSON.
+
+import sys
+from typing import Optional, Tuple
+#%%
+"""
+Safely walks a nested ORCID JSON structure along the given keys.
+ORCID uses both missing keys and explicit nulls, so every step tolerates `None`.
+"""
+
+def _path(node, *keys):
+    for key in keys:
+        # Stop as soon as a level is missing or not a dictionary
+        if not isinstance(node, dict):
+            return None
+        node = node.get(key)
+    return node
+
+
+"""
+Interns a string so repeated values (e.g. organization names shared by many profiles) are stored only once.
+"""
+
+def _intern(value) -> Optional[str]:
+    # Empty or missing values are normalized to None
+    if not value:
+        return None
+    return sys.intern(str(value))
+
+
+"""
+Parses the year of an ORCID fuzzy date (`{"year": {"value": "2019"}, ...}`) once into an integer.
+"""
+
+def _year(date_node) -> Optional[int]:
+    value = _path(date_node, "year", "value")
+    try:
+        return int(value) if value else None
+    except (TypeError, ValueError):
+        # Malformed years are treated as missing
+        return None
+#%%
+"""
+Affiliation with an organization and optional start/end years.
+The subclasses only name the ORCID section the fact came from.
+"""
+
+class AffiliationFact:
+    __slots__ = ("organization", "start_year", "end_year")
+
+    def __init__(self, organization: str, start_year: Optional[int] = None, end_year: Optional[int] = None):
+        self.organization = organization
+        self.start_year = start_year
+        self.end_year = end_year
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({self.organization!r}, {self.start_year!r}, {self.end_year!r})"
+
+
+# Education entry → Wikidata P69 (educated at)
+class EducationFact(AffiliationFact):
+    __slots__ = ()
+
+
+# Employment entry → Wikidata P108 (employer)
+class EmploymentFact(AffiliationFact):
+    __slots__ = ()
+
+
+# Membership entry → Wikidata P463 (member of)
+class MembershipFact(AffiliationFact):
+    __slots__ = ()
+
+
+"""
+Work entry (e.g. publication) → Wikidata P800 (notable work).
+"""
+
+class WorkFact:
+    __slots__ = ("title",)
+
+    def __init__(self, title: str):
+        self.title = title
+
+    def __repr__(self) -> str:
+        return f"WorkFact({self.title!r})"
+
+
+"""
+Peer review entry → Wikidata P4032 (reviewed by) with optional ISSN qualifier (P236).
+"""
+
+class PeerReviewFact:
+    __slots__ = ("organization", "issn", "completion_year")
+
+    def __init__(self, organization: str, issn: Optional[str] = None, completion_year: Optional[int] = None):
+        self.organization = organization
+        self.issn = issn
+        self.completion_year = completion_year
+
+    def __repr__(self) -> str:
+        return f"PeerReviewFact({self.organization!r}, {self.issn!r}, {self.completion_year!r})"
+
+
+"""
+Funding entry (grant, award, …) → Wikidata P8324 (funder) with optional start time (P580).
+"""
+
+class FundingFact:
+    __slots__ = ("organization", "start_year")
+
+    def __init__(self, organization: str, start_year: Optional[int] = None):
+        self.organization = organization
+        self.start_year = start_year
+
+    def __repr__(self) -> str:
+        return f"FundingFact({self.organization!r}, {self.start_year!r})"
+
+
+"""
+A researcher together with the facts extracted from their ORCID profile.
+The same record is used for staff rows (name, institution, employer QID) and for full profiles.
+"""
+
+class Researcher:
+    __slots__ = ("orcid", "name", "institution", "employer", "source_url",
+                 "education", "works", "peer_reviews", "employment", "funding", "memberships")
+
+    def __init__(self, orcid: str = "", name: str = "", institution: Optional[str] = None,
+                 employer: Optional[str] = None, source_url: str = "",
+                 education: Tuple[EducationFact, ...] = (),
+                 works: Tuple[WorkFact, ...] = (),
+                 peer_reviews: Tuple[PeerReviewFact, ...] = (),
+                 employment: Tuple[EmploymentFact, ...] = (),
+                 funding: Tuple[FundingFact, ...] = (),
+                 memberships: Tuple[MembershipFact, ...] = ()):
+        self.orcid = orcid
+        self.name = name
+        self.institution = _intern(institution)
+        self.employer = employer
+        self.source_url = source_url or (f"https://orcid.org/{orcid}" if orcid else "")
+        self.education = tuple(education)
+        self.works = tuple(works)
+        self.peer_reviews = tuple(peer_reviews)
+        self.employment = tuple(employment)
+        self.funding = tuple(funding)
+        self.memberships = tuple(memberships)
+
+    def __repr__(self) -> str:
+        return (f"Researcher({self.orcid!r}, {self.name!r}, education={len(self.education)}, "
+                f"works={len(self.works)}, peer_reviews={len(self.peer_reviews)}, employment={len(self.employment)}, "
+                f"funding={len(self.funding)}, memberships={len(self.memberships)})")
+#%%
+"""
+Extractors that turn a single raw ORCID summary into a compact fact.
+They are called at fetch time, so the raw JSON can be discarded right after the request.
+Each returns `None` if the summary lacks the value the QS mapping needs.
+"""
+
+def _affiliation(summary: dict, fact_type):
+    org = _intern(_path(summary, "organization", "name"))
+    if not org:
+        return None
+    return fact_type(org, _year(summary.get("start-date")), _year(summary.get("end-date")))
+
+
+def education_from_summary(summary: dict) -> Optional[EducationFact]:
+    return _affiliation(summary, EducationFact)
+
+
+def employment_from_summary(summary: dict) -> Optional[EmploymentFact]:
+    return _affiliation(summary, EmploymentFact)
+
+
+def membership_from_summary(summary: dict) -> Optional[MembershipFact]:
+    return _affiliation(summary, MembershipFact)
+
+
+def funding_from_summary(summary: dict) -> Optional[FundingFact]:
+    org = _intern(_path(summary, "organization", "name"))
+    if not org:
+        return None
+    return FundingFact(org, _year(summary.get("start-date")))
+
+
+def work_from_summary(summary: dict) -> Optional[WorkFact]:
+    title = _path(summary, "title", "title", "value")
+    if not title:
+        return None
+    return WorkFact(title)
+
+
+def peer_review_from_summary(summary: dict) -> Optional[PeerReviewFact]:
+    org = _intern(_path(summary, "convening-organization", "name"))
+    if not org:
+        return None
+
+    # Only group IDs of the form "issn:XXXX-XXXX" carry a usable ISSN
+    group_id = summary.get("review-group-id") or ""
+    issn = group_id[len("issn:"):] if group_id.startswith("issn:") else None
+    return PeerReviewFact(org, _intern(issn), _year(summary.get("completion-date")))
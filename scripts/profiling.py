@@ -0,0 +1,212 @@
+#%%
+# Optional CPU and memory profiling of pipeline stages.
+# A profiling session records per stage: cProfile statistics, tracemalloc peak and top allocations,
+# wall-clock time split into CPU time, network wait and other waiting (e.g. rate-limit sleeps),
+# plus sampled call stacks in the collapsed format used by flamegraph tools.
+
+import cProfile, io, os, pstats, sys, threading, time, tracemalloc
+from collections import Counter
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, List, Optional
+
+# Session that is currently recording (at most one per process)
+_ACTIVE: Optional["PipelineProfiler"] = None
+
+# Seconds between two stack samples for the collapsed-stack output
+SAMPLE_INTERVAL = 0.005
+
+# Number of allocation sites listed per stage in the report
+TOP_ALLOCATIONS = 10
+#%%
+"""
+Measurements of a single pipeline stage.
+"""
+
+class StageStats:
+    __slots__ = ("name", "wall", "cpu", "network", "peak_memory", "top_allocations", "profile")
+
+    def __init__(self, name: str):
+        self.name = name
+        self.wall = 0.0
+        self.cpu = 0.0
+        self.network = 0.0
+        self.peak_memory = 0
+        self.top_allocations: List[str] = []
+        self.profile = cProfile.Profile()
+#%%
+"""
+Profiling session for one entry point run.
+Without a report path the profiler is disabled and `stage(...)` costs nothing.
+"""
+
+class PipelineProfiler:
+    def __init__(self, report_path=None):
+        self.report_path = Path(report_path) if report_path else None
+        self.stages: Dict[str, StageStats] = {}
+        self.samples: Counter = Counter()
+        self._current: Optional[StageStats] = None
+        self._thread_id = threading.get_ident()
+        self._stop = threading.Event()
+        self._sampler: Optional[threading.Thread] = None
+
+        # Whether start() turned tracemalloc on (tracing started by the caller is left running)
+        self._owns_tracing = False
+
+    @property
+    def enabled(self) -> bool:
+        return self.report_path is not None
+
+    """
+    Measures the enclosed block as the named stage. Re-entering a stage name accumulates its numbers.
+    """
+
+    @contextmanager
+    def stage(self, name: str):
+        # Disabled or already inside a stage (cProfile cannot be nested) → just run the block
+        if not self.enabled or self._current is not None:
+            yield
+            return
+
+        stats = self.stages.setdefault(name, StageStats(name))
+        self._current = stats
+        tracemalloc.reset_peak()
+        wall_start, cpu_start = time.perf_counter(), time.process_time()
+        stats.profile.enable()
+        try:
+            yield
+        finally:
+            stats.profile.disable()
+            stats.wall += time.perf_counter() - wall_start
+            stats.cpu += time.process_time() - cpu_start
+            stats.peak_memory = max(stats.peak_memory, tracemalloc.get_traced_memory()[1])
+            self._current = None
+
+            # Top allocation sites still alive at the end of the stage (taken after timing, so not counted)
+            snapshot = tracemalloc.take_snapshot().filter_traces(
+                [tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, __file__)])
+            stats.top_allocations = [str(s) for s in snapshot.statistics("lineno")[:TOP_ALLOCATIONS]]
+
+    """
+    Adds the wall-clock time of the enclosed block to the network wait of the current stage.
+    """
+
+    @contextmanager
+    def network(self):
+        stats = self._current
+        if stats is None:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            stats.network += time.perf_counter() - start
+
+    # Background thread that samples the call stack of the profiled thread
+    def _sample(self):
+        while not self._stop.wait(SAMPLE_INTERVAL):
+            stats = self._current
+            frame = sys._current_frames().get(self._thread_id)
+            if stats is None or frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            stack.append(stats.name)
+            self.samples[";".join(reversed(stack))] += 1
+
+    def start(self):
+        if not self.enabled:
+            return
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._owns_tracing = True
+        self._sampler = threading.Thread(target=self._sample, name="profiling-sampler", daemon=True)
+        self._sampler.start()
+
+    def stop(self):
+        if not self.enabled:
+            return
+        self._stop.set()
+        if self._sampler is not None:
+            self._sampler.join()
+        if self._owns_tracing:
+            tracemalloc.stop()
+            self._owns_tracing = False
+
+    """
+    Writes the report files next to `report_path`:
+    `<path>.txt` (summary), `<path>.pstats` (all stages), `<path>.<stage>.pstats` and `<path>.collapsed`.
+    """
+
+    def write_report(self):
+        if not self.enabled or not self.stages:
+            return
+        base = self.report_path
+        base.parent.mkdir(parents=True, exist_ok=True)
+
+        lines = [f"{'stage':<16}{'wall s':>10}{'cpu s':>10}{'network s':>11}{'other s':>10}{'peak MiB':>10}"]
+        for s in self.stages.values():
+            other = max(s.wall - s.cpu - s.network, 0.0)
+            lines.append(f"{s.name:<16}{s.wall:>10.3f}{s.cpu:>10.3f}{s.network:>11.3f}{other:>10.3f}"
+                         f"{s.peak_memory / 2**20:>10.2f}")
+
+        combined = None
+        for s in self.stages.values():
+            s.profile.dump_stats(f"{base}.{s.name}.pstats")
+            out = io.StringIO()
+            stats = pstats.Stats(s.profile, stream=out).sort_stats("cumulative")
+            stats.print_stats(15)
+            lines += ["", f"== {s.name}: top allocations", *s.top_allocations,
+                      "", f"== {s.name}: cProfile (cumulative)", out.getvalue().strip()]
+            if combined is None:
+                combined = pstats.Stats(s.profile)
+            else:
+                combined.add(s.profile)
+        combined.dump_stats(f"{base}.pstats")
+
+        Path(f"{base}.txt").write_text("\n".join(lines) + "\n", encoding="utf-8")
+        with open(f"{base}.collapsed", "w", encoding="utf-8") as f:
+            for stack, count in sorted(self.samples.items()):
+                f.write(f"{stack} {count}\n")
+        print(f"✓ Profile report → {base}.txt")
+#%%
+"""
+Opens a profiling session for an entry point. With `report_path=None` a disabled profiler is returned,
+so callers can always write `with prof.stage(...)`.
+"""
+
+@contextmanager
+def profile_session(report_path=None):
+    global _ACTIVE
+    prof = PipelineProfiler(report_path)
+    if not prof.enabled or _ACTIVE is not None:
+        # Nested entry points are recorded by the outer session
+        yield _ACTIVE or prof
+        return
+
+    _ACTIVE = prof
+    prof.start()
+    try:
+        yield prof
+    finally:
+        prof.stop()
+        _ACTIVE = None
+        prof.write_report()
+
+
+"""
+Marks a network call so its duration is reported as network wait instead of unexplained wall time.
+No-op when no profiling session is active.
+"""
+
+@contextmanager
+def network_wait():
+    if _ACTIVE is None:
+        yield
+        return
+    with _ACTIVE.network():
+        yield
@@ -3,19 +3,22 @@
 
 import csv, time, os, re
 import pandas as pd
-from typing import Optional, Dict
-from functools import lru_cache  # CACHE
+from typing import Optional
 #%%
 # Brings in project-specific helper functions.
 
 from find_qid import find_qid_by_orcid
-from find_qid import _api_get
+from find_qid import _api_get, CACHE_SIZE, CACHE_TTL
+from memo import memoize  # CACHE
+from orcid_records import Researcher
+from sharding import in_shard, shard_path, shard_files, merge_qs, merge_csv
+from profiling import profile_session
 #%%
 """
 Searches for the Wikidata QID of a given label (name), optionally language-specific.
 """
 
-@lru_cache(maxsize=None)  # API/cache
+@memoize(maxsize=CACHE_SIZE, ttl=CACHE_TTL)  # API/cache
 def find_qid_by_name(name: str, lang: str = "en") -> Optional[str]:
     # Abort directly if input is empty
     if not name:
@@ -41,128 +44,129 @@ def find_qid_by_name(name: str, lang: str = "en") -> Optional[str]:
 #%%
 """
 Searches for a Wikidata QID for an institution by its label.
-Results are cached locally.
+Results (including "not found") are cached; concurrent lookups of the same label share one request.
 """
 
-# Simple cache: institution label → QID (or None if not found)
-inst_cache: Dict[str, Optional[str]] = {}
-
+@memoize(maxsize=CACHE_SIZE, ttl=CACHE_TTL)  # API/cache
 def find_qid_by_institution_label(label: str) -> Optional[str]:  # API
     # Abort if no input
     if not label:
         return None
 
-    # Return from cache if already present
-    if label in inst_cache:
-        return inst_cache[label]
-
     # Search Wikidata by label – first in English, then in German
     for lang in ("en", "de"):
         data = _api_get({
             "action": "wbsearchentities", "search": label, "language": lang,
             "type": "item", "limit": 1, "format": "json"})
 
-        # If match found → extract and cache QID
+        # If match found → extract QID
         if data.get("search"):
             qid = data["search"][0]["id"]
-            inst_cache[label] = qid
 
             # Optional info output if German label was used
             if lang == "de":
                 print(f"[info] Institution '{label}' found via German label → {qid}")
             return qid
 
-    # No match in either language → cache with None
-    inst_cache[label] = None
+    # No match in either language → None (cached as well)
     return None
 #%%
 """
 This function generates QuickStatements for creating new person entries in Wikidata based on an enriched input file.
 Existing persons are skipped, while new ones are added with label, ORCID, source, and institution.
+With a shard ("i/N" as tuple), only the rows hashed to that shard by name + ORCID are processed.
+With `profile` (report path), the stages load/lookup/write are profiled and a report is written (see `profiling.py`).
 """
 
-def file_to_qs(infile: str, outfile: str) -> None:
-    # Determine file extension (xls/xlsx or csv)
-    ext = os.path.splitext(infile)[1].lower()
-
-    # Read input file depending on format
-    df = pd.read_excel(infile) if ext in {".xlsx", ".xls"} else pd.read_csv(infile)
-
-    # Check if all required columns are present
-    required = {"Name", "Institution", "ORCID", "ORCID-Link"}
-    missing = required - set(df.columns)
-    if missing:
-        raise ValueError(f"Missing columns: {', '.join(sorted(missing))}")
-
-    # Initialize result list and deduplication tracker
-    rows = []
-    processed = set()
-
-    # Iterate through all rows of input file
-    for _, r in df.iterrows():
-        name = str(r["Name"]).strip()
-
-        # If ORCID is NaN, treat it as empty string
-        orcid = str(r["ORCID"]).strip() if pd.notna(r["ORCID"]) else ""
-
-        # Deduplicate by name + ORCID (lowercased)
-        key = (name.lower(), orcid)
-        if key in processed:
-            continue
-        processed.add(key)
-
-        # Prepare institution and URL
-        inst_label = str(r["Institution"]).strip()
-        url = r["ORCID-Link"] if pd.notna(r["ORCID-Link"]) else ""
-
-        # Check if person already exists (via ORCID or name)
-        qid = find_qid_by_orcid(orcid) or find_qid_by_name(name)
-        if qid:
-            print(f"[skip] {name} already exists as {qid}")
-            continue
-
-        # Try to find institution QID
-        inst_qid = find_qid_by_institution_label(inst_label)
-        if not inst_qid:
-            print(f"[warn] Institution '{inst_label}' not found ⇒ skipped")
-            continue
-
-        # Build QuickStatements row
-        rows.append({
-            "qid": "CREATE",
-            "Len": name,
-            "P31": "Q5",          # instance of → human
-            "P496": orcid,        # ORCID
-            "S854": url,          # source (URL)
-            "P108": inst_qid,     # employer/affiliation
-        })
-
-        # Short pause to avoid overloading the API
-        time.sleep(0.1)
-
-    # If no new rows → skip export
-    if not rows:
-        print("No new items – nothing exported.")
-        return
-
-    #####################################################################
-    # NEW: Write the QuickStatements-File in a CSV-File
-    """field_order = ["qid", "Len", "P31", "P496", "S854", "P108"]
-    with open(outfile, "w", newline="", encoding="utf-8") as f:
-        writer = csv.DictWriter(f, fieldnames=field_order)
-        writer.writeheader()
-        writer.writerows(rows)"""
-
-    # NEW: Write the QuickStatements-File in a CSV-File
-    with open(outfile, "w", encoding="utf-8") as f:
-        for r in rows:
-            f.write("CREATE\n")
-            f.write(f'LAST|Len|"{r["Len"]}"\n')
-            f.write("LAST|P31|Q5\n")
-            if r["P496"]:
-                f.write(f'LAST|P496|"{r["P496"]}"|S854|"{r["S854"]}"\n')
-            f.write(f"LAST|P108|{r['P108']}\n\n")
-    #####################################################################
+def file_to_qs(infile: str, outfile: str, shard=None, profile: Optional[str] = None) -> None:
+    # Optional profiling session (one report per shard)
+    with profile_session(shard_path(profile, shard) if profile else None) as prof:
+        with prof.stage("load"):
+            # Determine file extension (xls/xlsx or csv)
+            ext = os.path.splitext(infile)[1].lower()
+
+            # Read input file depending on format
+            df = pd.read_excel(infile) if ext in {".xlsx", ".xls"} else pd.read_csv(infile)
+
+            # Check if all required columns are present
+            required = {"Name", "Institution", "ORCID", "ORCID-Link"}
+            missing = required - set(df.columns)
+            if missing:
+                raise ValueError(f"Missing columns: {', '.join(sorted(missing))}")
+
+        with prof.stage("lookup"):
+            # Initialize result list and deduplication tracker
+            rows = []
+            processed = set()
+
+            # Iterate through all rows of input file (column-wise zip avoids building a Series per row)
+            for raw_name, raw_inst, raw_orcid, raw_url in zip(df["Name"], df["Institution"], df["ORCID"], df["ORCID-Link"]):
+                name = str(raw_name).strip()
+
+                # If ORCID is NaN, treat it as empty string
+                orcid = str(raw_orcid).strip() if pd.notna(raw_orcid) else ""
+
+                # Skip rows that belong to another shard
+                if not in_shard(name, orcid, shard):
+                    continue
+
+                # Deduplicate by name + ORCID (lowercased)
+                key = (name.lower(), orcid)
+                if key in processed:
+                    continue
+                processed.add(key)
+
+                # Prepare institution and URL
+                inst_label = str(raw_inst).strip()
+                url = raw_url if pd.notna(raw_url) else ""
+
+                # Check if person already exists (via ORCID or name)
+                qid = find_qid_by_orcid(orcid) or find_qid_by_name(name)
+                if qid:
+                    print(f"[skip] {name} already exists as {qid}")
+                    continue
+
+                # Try to find institution QID
+                inst_qid = find_qid_by_institution_label(inst_label)
+                if not inst_qid:
+                    print(f"[warn] Institution '{inst_label}' not found ⇒ skipped")
+                    continue
+
+                # Build compact record for the QuickStatements block (P31 is always Q5 → human)
+                rows.append(Researcher(
+                    orcid=orcid,          # ORCID (P496)
+                    name=name,            # English label (Len)
+                    institution=inst_label,
+                    employer=inst_qid,    # employer/affiliation (P108)
+                    source_url=url,       # source (S854)
+                ))
+
+                # Short pause to avoid overloading the API
+                time.sleep(0.1)
+
+        with prof.stage("write"):
+            # If no new rows → an empty file is still written, so a shard never leaves a missing or stale output
+            if not rows:
+                print("No new items – empty output written.")
+
+            #####################################################################
+            # NEW: Write the QuickStatements-File in a CSV-File
+            """field_order = ["qid", "Len", "P31", "P496", "S854", "P108"]
+            with open(outfile, "w", newline="", encoding="utf-8") as f:
+                writer = csv.DictWriter(f, fieldnames=field_order)
+                writer.writeheader()
+                writer.writerows(rows)"""
+
+            # NEW: Write the QuickStatements-File in a CSV-File
+            with open(outfile, "w", encoding="utf-8") as f:
+                for r in rows:
+                    f.write("CREATE\n")
+                    f.write(f'LAST|Len|"{r.name}"\n')
+                    f.write("LAST|P31|Q5\n")
+                    if r.orcid:
+                        f.write(f'LAST|P496|"{r.orcid}"|S854|"{r.source_url}"\n')
+                    f.write(f"LAST|P108|{r.employer}\n\n")
+            #####################################################################
 
     # Success message with row count
     print(f"✓ {len(rows)} QuickStatements rows → {outfile}")
@@ -174,8 +178,21 @@ csv_input_path = "../outputs/input_with_orcid.csv"
 # Path to output file for generated QuickStatements in CSV format
 csv_output_path = "../outputs/qs_main_items.csv"
 
+# Path to the ORCID list used by the further-items step
+orcid_only_path = "../outputs/orcid_only.csv"
+
+# Optional shard (index, count) for sharded runs, e.g. (0, 4); None processes all rows
+SHARD = None
+
+# Optional profiling report path, e.g. "../outputs/profile/qs_csv"; None disables profiling
+PROFILE = None
+
 # Start processing: check existing QIDs and create new QS rows
-file_to_qs(csv_input_path, csv_output_path)
+file_to_qs(csv_input_path, shard_path(csv_output_path, SHARD), SHARD, PROFILE)
+
+# Cache statistics of the Wikidata lookups (hits, misses, coalesced concurrent requests)
+print(f"✓ Lookup caches: ORCID {find_qid_by_orcid.cache_stats()}, name {find_qid_by_name.cache_stats()}, "
+      f"institution {find_qid_by_institution_label.cache_stats()}")
 #%%
 #####################################################################
 """ OLD:
@@ -191,25 +208,26 @@ print("✓ ORCID list was exported")
 #####################################################################
 # NEW:
 #####################################################################
-# Load the QuickStatements CSV file
-df_main = pd.read_csv(csv_output_path)
-
-# Filter only the rows that contain an ORCID (P496)
-orcid_lines = df_main[df_main['CREATE'].str.contains("P496", na=False)]
+# Load the QuickStatements file as text (it may be empty if a shard had no new items)
+with open(shard_path(csv_output_path, SHARD), encoding="utf-8") as f:
+    qs_text = f.read()
 
 # Extract ORCID values using a regular expression
 # The pattern looks for: P496|"0000-0001-2345-6789"
-orcids = orcid_lines['CREATE'].apply(lambda x: re.search(r'P496\|\"([\d\-X]+)\"', x))
-orcid_values = orcids.dropna().apply(lambda m: m.group(1))
+orcid_values = re.findall(r'P496\|\"([\d\-X]+)\"', qs_text)
 
-# Convert the extracted values into a new DataFrame
-orcid_df = pd.DataFrame(orcid_values, columns=["orcid"])
+# Convert the extracted values into a new DataFrame (header only if there are none)
+orcid_df = pd.DataFrame({"orcid": orcid_values})
 
 # Export the result to CSV
-orcid_df.to_csv("../outputs/orcid_only.csv", index=False)
+orcid_df.to_csv(shard_path(orcid_only_path, SHARD), index=False)
 print("✓ ORCID list exported successfully.")
 #####################################################################
 #%%
+# Merge per-shard outputs once all shards have finished (deduplicated across shards, deterministic order)
+# merge_qs(shard_files(csv_output_path), csv_output_path)
+# merge_csv(shard_files(orcid_only_path), orcid_only_path, key=lambda row: (row["orcid"],))
+#%%
 # Test call (commented out)
 # orcid = "0000-0002-1481-2996"
 # data = fetch_orcid_sections(orcid)
@@ -10,97 +10,108 @@ from tqdm import tqdm
 
 from find_qid import find_qid_by_orcid
 from find_qid import _api_get
+from orcid_records import Researcher, education_from_summary, work_from_summary, peer_review_from_summary, \
+    employment_from_summary, funding_from_summary, membership_from_summary
+from sharding import shard_path, shard_files, merge_qs
+from profiling import profile_session, network_wait
+from orcid_cache import ProfileCache
+from qs_mapping import CompiledMapping, DEFAULT_MAPPING
 #%%
-# Defines a reusable function to extract selected sections from an ORCID profile (education, works, peer reviews).
-# The output is structured and ready for mapping to Wikidata properties.
-
-def fetch_orcid_sections(orcid_id: str) -> dict:
+# Defines a reusable function to extract selected sections from an ORCID profile
+# (employment, education, works, peer reviews, funding, memberships).
+# Only the fields needed for the Wikidata mapping are kept; the raw JSON is discarded right after each request.
+# With a ProfileCache, sections are revalidated conditionally and only changed sections are downloaded and mapped again.
+# `sections` (Researcher attributes, e.g. from DEFAULT_MAPPING.active_sections(limits)) restricts the download
+# to the sections that are exported; None fetches all of them.
+
+def fetch_orcid_sections(orcid_id: str, cache: ProfileCache = None, sections=None) -> Researcher:
     headers = {"Accept": "application/json"}
     base_url = f"https://pub.orcid.org/v3.0/{orcid_id}"
 
-    # def fetch_employment():
-    #     url = f"{base_url}/employments"
-    #     resp = requests.get(url, headers=headers)
-    #     out = []
-    #     if resp.ok:
-    #         for group in resp.json().get("affiliation-group", []):
-    #             for s in group.get("summaries", []):
-    #                 emp = s.get("employment-summary")
-    #                 if emp:
-    #                     out.append(emp)
-    #     return out[:5]
-
-    # Retrieves education summaries from ORCID.
-    def fetch_education():
-        url = f"{base_url}/educations"
-        resp = requests.get(url, headers=headers)
-        out = []
-        if resp.ok:
-            for group in resp.json().get("affiliation-group", []):
+    # Downloads one section (via the cache if given) and maps its payload with `extract`.
+    def fetch(section, extract):
+        url = f"{base_url}/{section}"
+        if cache is not None:
+            return cache.section(orcid_id, section, url, extract)
+        with network_wait():
+            resp = requests.get(url, headers=headers)
+        return extract(resp.json()) if resp.ok else []
+
+    # Builds an extractor for affiliation sections (employments, educations, memberships).
+    def affiliations(summary_key, from_summary):
+        def extract(payload):
+            out = []
+            for group in payload.get("affiliation-group", []):
                 for s in group.get("summaries", []):
-                    edu = s.get("education-summary")
-                    if edu:
-                        out.append(edu)
+                    fact = from_summary(s.get(summary_key))
+                    if fact:
+                        out.append(fact)
+            return out
+        return extract
+
+    # Extracts fundings; only the first (preferred) version per group is used.
+    def extract_funding(payload):
+        out = []
+        for group in payload.get("group", []):
+            funding_summary = group.get("funding-summary", [])
+            if funding_summary:
+                funding = funding_from_summary(funding_summary[0])
+                if funding:
+                    out.append(funding)
         return out
 
-    # Fetches works (e.g. publications); only the top(x) version per entry is used.
-    def fetch_works():
-        url = f"{base_url}/works"
-        resp = requests.get(url, headers=headers)
+    # Extracts works (e.g. publications); only the first (representative) version per group is used.
+    # All works are kept; how many are exported is decided by the mapping spec and `limits`.
+    def extract_works(payload):
         out = []
-        if resp.ok:
-            for group in resp.json().get("group", []):
-                work_summary = group.get("work-summary", [])
-                if work_summary:
-                    out.append(work_summary[0])  # only the first (representative) version
-        return out[:5]
+        for group in payload.get("group", []):
+            work_summary = group.get("work-summary", [])
+            if work_summary:
+                work = work_from_summary(work_summary[0])  # only the first (representative) version
+                if work:
+                    out.append(work)
+        return out
 
-    # Collects peer review activity data from ORCID.
-    def fetch_peer_reviews():
-        url = f"{base_url}/peer-reviews"
-        resp = requests.get(url, headers=headers)
+    # Collects peer review activity data.
+    def extract_peer_reviews(payload):
         out = []
-        if resp.ok:
-            for group in resp.json().get("group", []):
-                for subgroup in group.get("peer-review-group", []):
-                    for summary in subgroup.get("peer-review-summary", []):
-                        out.append(summary)
+        for group in payload.get("group", []):
+            for subgroup in group.get("peer-review-group", []):
+                for summary in subgroup.get("peer-review-summary", []):
+                    review = peer_review_from_summary(summary)
+                    if review:
+                        out.append(review)
         return out
 
-    # Returns selected sections as a dictionary, ready for further processing.
-    return {
-        # "Employment": fetch_employment(),
-        "Education and qualification": fetch_education(),
-        "Work": fetch_works(),
-        "Peer Reviews": fetch_peer_reviews(),
+    # Researcher attribute → (ORCID endpoint, extractor)
+    endpoints = {
+        "employment": ("employments", affiliations("employment-summary", employment_from_summary)),
+        "education": ("educations", affiliations("education-summary", education_from_summary)),
+        "works": ("works", extract_works),
+        "peer_reviews": ("peer-reviews", extract_peer_reviews),
+        "funding": ("fundings", extract_funding),
+        "memberships": ("memberships", affiliations("membership-summary", membership_from_summary)),
     }
 
-#%%
-"""
-Sorts a list of ORCID entries by their completion year in descending order.
-Handles missing years gracefully by pushing them to the end.
-"""
-
-def sort_by_completion_year(entries, reverse=True):
-    def extract_year(entry):
-        # Extracts the year from a nested “completion-date” structure; defaults to 9999 if missing.
-        return int(entry.get("completion-date", {}).get("year", {}).get("value") or 9999)
-    # Sorts entries by extracted year, newest first (default).
-    return sorted(entries, key=extract_year, reverse=reverse)
-#%%
-# Test call
-# peer_list = sort_by_completion_year(data.get("Peer Reviews", []))
-# review = peer_list[0] if peer_list else None
+    # Returns a compact researcher record, ready for further processing; skipped sections stay empty.
+    return Researcher(
+        orcid=orcid_id,
+        **{attr: fetch(section, extract) for attr, (section, extract) in endpoints.items()
+           if sections is None or attr in sections},
+    )
 
-# print(review)
 #%%
 """
 Reads a pre-filtered CSV of ORCID entries and checks for each whether a corresponding Wikidata Q-ID already exists.
 Rows with missing data are skipped.
+In a sharded run, the ORCID list written by the same shard of `qs_csv` is used.
 """
 
+# Optional shard (index, count) for sharded runs, e.g. (0, 4); None processes all rows
+SHARD = None
+
 # Loads the input CSV and removes any rows with missing values.
-csv_input_path = "../outputs/orcid_only.csv"
+csv_input_path = shard_path("../outputs/orcid_only.csv", SHARD)
 df = pd.read_csv(csv_input_path).dropna()
 # df = df.head(15)
 
@@ -114,11 +125,17 @@ for _, r in df.iterrows():
     qid = find_qid_by_orcid(orcid)
 #%%
 """
-This function generates Wikidata QuickStatements from ORCID data, structured by section (Education → P69, Works → P800, Peer Reviews → P4032).
+This function generates Wikidata QuickStatements from ORCID data, structured by section (Employment → P108, Education → P69,
+Works → P800, Peer Reviews → P4032, Funding → P8324, Memberships → P463) as defined by the declarative spec in `qs_mapping.py`.
 It writes each block with proper source and date qualifiers.
+`data_dict` maps each ORCID iD to the `Researcher` record returned by `fetch_orcid_sections`.
+`limits` maps section names (e.g. "education") to the maximum number of entries per person and overrides the spec.
+With `profile` (report path), the export is profiled as stage "export" and a report is written (see `profiling.py`);
+if a session is already open (e.g. around the ORCID downloads), the stage is added to that session's report.
 """
 
-def export_orcid_qs(data_dict: dict, output_path: str, limits: dict):
+def export_orcid_qs(data_dict: dict, output_path: str, limits: dict, profile: str = None,
+                    mapping: CompiledMapping = DEFAULT_MAPPING):
     today = date.today().isoformat()
     today_wd = f'+{today}T00:00:00Z/11'
 
@@ -126,124 +143,37 @@ def export_orcid_qs(data_dict: dict, output_path: str, limits: dict):
     # writer = csv.writer(f, delimiter='|', quoting=csv.QUOTE_MINIMAL)
     # writer.writerow(['ID', 'P', 'Value', 'Qualifier_P', 'Qualifier_V', 'S854', 'S813'])
 
-    # Opens output file for writing QuickStatements
-    with open(output_path, mode='w', encoding='utf-8') as f:
-        # Iterates through all ORCID profiles
-        # for orcid_id, sections in data_dict.items():
-        for orcid_id, sections in tqdm(data_dict.items(), desc="Exportiere QS-Zeilen"):
-            source_url = f"https://orcid.org/{orcid_id}"
-
-            ####################################################################
-            # Noch keine QIDs, da die Einträge noch nicht existieren
-            ####################################################################
-            qids = False # --> Set to on True when the new entries have been imported
-            ####################################################################
-            QID = "None"
-            # Currently unused. future logic to switch to the edit mode
-            if qids == True:
-                QID = qid
-                qid = find_qid_by_orcid(orcid_id)
-                if not qid:
-                    print(f"[warn] Keine QID für ORCID {orcid_id} gefunden – übersprungen")
-                    continue
-                f.write(f"{qid}\n")
-            ####################################################################
-
-            # EMPLOYMENT → P108
-            # for emp in sections.get("Employment", [])[:limits.get("Employment", 1)]:
-            #     if not isinstance(emp, dict):
-            #         continue
-            #     org = emp.get('organization', {}).get('name')
-            #     start = (emp.get('start-date') or {}).get('year', {}).get('value') or {}
-            #     start_fmt = f'+{start}-00-00T00:00:00Z/9' if start else ''
-            #     if org:
-            #         row = ['CREATE', 'P108', org]
-            #         row += ['P580', start_fmt] if start_fmt else ['', '']
-            #         row += ['S854', source_url, 'S813', today_wd]
-            #         writer.writerow(row)
-
-            # EDUCATION → P69
-            # Iterates over education entries.
-            # for edu in sections.get("Education and qualification", [])[:limits.get("Education", 0)]:
-            for edu in tqdm(sections.get("Education", [])[:limits.get("Education", 0)], desc=f"{orcid_id} - Education", leave=True):
-                if not isinstance(edu, dict):
-                    continue
-
-                inst = edu.get('organization', {}).get('name')
-                start = (edu.get('start-date') or {}).get('year', {}).get('value')
-                start_fmt = f'+{start}-00-00T00:00:00Z/9' if start else ''
-                if inst:
-                    """ OLD
-                    row = ['CREATE', 'P69', inst]
-                    row += ['P580', start_fmt] if start_fmt else ['', '']
-                    row += ['S854', source_url, 'S813', today_wd]
-                    writer.writerow(row)
-                    """
-                    ################################################################
-                    # NEW:
+    # Optional profiling session covering the whole export
+    with profile_session(profile) as prof, prof.stage("export"):
+        # Opens output file for writing QuickStatements
+        with open(output_path, mode='w', encoding='utf-8') as f:
+            # Iterates through all ORCID profiles
+            # for orcid_id, sections in data_dict.items():
+            for orcid_id, researcher in tqdm(data_dict.items(), desc="Exportiere QS-Zeilen"):
+                source_url = researcher.source_url or f"https://orcid.org/{orcid_id}"
+
+                ####################################################################
+                # Noch keine QIDs, da die Einträge noch nicht existieren
+                ####################################################################
+                qids = False # --> Set to on True when the new entries have been imported
+                ####################################################################
+                QID = "None"
+                # Currently unused. future logic to switch to the edit mode
+                if qids == True:
+                    QID = qid
+                    qid = find_qid_by_orcid(orcid_id)
+                    if not qid:
+                        print(f"[warn] Keine QID für ORCID {orcid_id} gefunden – übersprungen")
+                        continue
+                    f.write(f"{qid}\n")
+                ####################################################################
+
+                # Applies all mapping rules (employment, education, works, peer reviews, funding, memberships)
+                # in a single pass over the profile; see qs_mapping.SPEC for section → property rules.
+                for line in mapping.lines(researcher, source_url, today_wd, limits):
                     # f.write("CREATE\n")
                     f.write(f"{QID}\n")
-                    line = f'LAST|P69|"{inst}"'
-                    if start_fmt:
-                        line += f'|P580|{start_fmt}'
-                    line += f'|S854|"{source_url}"|S813|{today_wd}\n'
-                    f.write(line)
-
-            # WORK → P800
-            # Iterates over work entries.
-            # for work in sections.get("Work", [])[:limits.get("Work", 0)]:
-            for work in tqdm(sections.get("Work", [])[:limits.get("Work", 0)], desc=f"{orcid_id} - Work", leave=True):
-                if not isinstance(work, dict):
-                    continue
-
-                title = work.get("title", {}).get("title", {}).get("value")
-                if title:
-                    """ OLD:
-                    row = ['CREATE', 'P800', title, '', '', 'S854', source_url, 'S813', today_wd]
-                    writer.writerow(row)
-                    """
-                    ################################################################
-                    # NEU:
-                    # f.write("CREATE\n")
-                    f.write(f"{QID}\n")
-                    line = f'LAST|P800|"{title}"|S854|"{source_url}"|S813|{today_wd}\n'
-                    f.write(line)
-
-            # PEER REVIEW → P4032
-            peer_list = sort_by_completion_year(sections.get("Peer Reviews", []))[:limits.get("Peer", 0)]
-            # Iterates over peer review entries.
-            # for review in peer_list:
-            for review in tqdm(peer_list, desc=f"{orcid_id} - Peer Review", leave=True):
-                if not isinstance(review, dict):
-                    continue
-
-                org = review.get("convening-organization", {}).get("name")
-                issn = review.get("review-group-id", "")
-
-                if issn.startswith("issn:"):
-                    issn = issn.replace("issn:", "")
-                else:
-                    issn = ""
-
-                if org:
-                    """ OLD:
-                    row = ['CREATE', 'P4032', org]
-                    if issn:
-                        row += ['P236', issn]
-                    else:
-                        row += ['', '']
-                    row += ['S854', source_url, 'S813', today_wd]
-                    writer.writerow(row)
-                    """
-                    ################################################################
-                    # NEU:
-                    # f.write("CREATE\n")
-                    f.write(f"{QID}\n")
-                    line = f'LAST|P4032|"{org}"'
-                    if issn:
-                        line += f'|P236|"{issn}"'
-                    line += f'|S854|"{source_url}"|S813|{today_wd}\n'
-                    f.write(line)
+                    f.write(line + "\n")
 #%%
 # Test call
 # orcid_id = "0000-0002-1481-2996"
@@ -259,19 +189,39 @@ structured QS output file. Limits are set to control how many items per section
 # Test
 # orcid_ids = ["0000-0002-1481-2996", "0000-0002-9421-8582"]
 
-# Extracts the ORCID column from the DataFrame and collects structured ORCID data for each ID.
-orcid_ids = df["orcid"]
-orcid_data = {oid: fetch_orcid_sections(oid) for oid in orcid_ids}
+# Local cache of ORCID sections; repeated runs only download sections that changed
+orcid_cache = ProfileCache("../outputs/orcid_cache")
 
-# Defines how many entries per section to export per person.
+# Defines how many entries per section to export per person (keys are the sections of qs_mapping.SPEC).
+# Sections with limit 0 are not downloaded at all.
 limits = {
-    #"Employment": 1,
-    "Education": 5,
-    "Work": 5,
-    "Peer": 5
+    "employment": 1,
+    "education": 5,
+    "works": 5,
+    "peer_reviews": 5,
+    "funding": 5,
+    "memberships": 5,
 }
-# print(orcid_data)
 
-# Generates and writes QuickStatements to output file using previously collected data and limits.
-export_orcid_qs(orcid_data, "../outputs/qs_further_items_output.csv", limits)
+# Optional profiling report path, e.g. "../outputs/profile/qs_further_items"; None disables profiling
+PROFILE = None
+profile_path = shard_path(PROFILE, SHARD) if PROFILE else None
+qs_output_path = "../outputs/qs_further_items_output.csv"
+
+# One profiling session covers both the ORCID downloads ("fetch") and the QS export ("export")
+with profile_session(profile_path) as prof:
+    # Extracts the ORCID column from the DataFrame and collects structured ORCID data for each ID.
+    with prof.stage("fetch"):
+        orcid_ids = df["orcid"]
+        sections = DEFAULT_MAPPING.active_sections(limits)
+        orcid_data = {oid: fetch_orcid_sections(oid, orcid_cache, sections) for oid in orcid_ids}
+    print(f"✓ ORCID cache: {orcid_cache.stats}")
+    # print(orcid_data)
+
+    # Generates and writes QuickStatements to output file using previously collected data and limits
+    # (export_orcid_qs records its "export" stage in the session opened above).
+    export_orcid_qs(orcid_data, shard_path(qs_output_path, SHARD), limits, profile_path)
+#%%
+# Merge per-shard outputs once all shards have finished (deduplicated across shards, deterministic order)
+# merge_qs(shard_files(qs_output_path), qs_output_path)
 #%%
@@ -0,0 +1,185 @@
+#%%
+# Declarative ORCID → Wikidata mapping for the further-items QuickStatements.
+# Each rule names a section of a `Researcher` record, the Wikidata property, the fact attribute holding the value,
+# qualifiers and a per-section limit. The rules are compiled once into emitter functions and applied
+# in a single pass over each profile, so adding a property does not add another pass over the data.
+
+from operator import attrgetter
+from typing import Callable, Dict, List, Optional, Tuple
+#%%
+"""
+Value formats used in QuickStatements lines.
+"""
+
+# Quoted string, e.g. "TH Köln"
+def _string(value) -> str:
+    return f'"{value}"'
+
+
+# Year precision time value, e.g. +2019-00-00T00:00:00Z/9
+def _year(value) -> str:
+    return f'+{value}-00-00T00:00:00Z/9'
+
+
+FORMATS: Dict[str, Callable[[object], str]] = {"string": _string, "year": _year}
+#%%
+"""
+A single mapping rule (section → property).
+
+    section     attribute of `Researcher` holding the facts, e.g. "education"
+    prop        Wikidata property of the statement, e.g. "P69"
+    value       attribute of the fact used as statement value, e.g. "organization"
+    qualifiers  (property, attribute, format) triples; qualifiers with an empty value are left out
+    limit       maximum number of facts of the section exported per person
+    order       optional (attribute, descending) the section is sorted by before the limit applies
+    references  whether S854 (source URL) and S813 (retrieved) are added
+"""
+
+class PropertyRule:
+    __slots__ = ("section", "prop", "value", "fmt", "qualifiers", "limit", "order", "references")
+
+    def __init__(self, section: str, prop: str, value: str, fmt: str = "string",
+                 qualifiers: Tuple[Tuple[str, str, str], ...] = (), limit: int = 5,
+                 order: Optional[Tuple[str, bool]] = None, references: bool = True):
+        self.section = section
+        self.prop = prop
+        self.value = value
+        self.fmt = fmt
+        self.qualifiers = tuple(qualifiers)
+        self.limit = limit
+        self.order = order
+        self.references = references
+
+
+# Default mapping of ORCID sections to Wikidata properties
+SPEC: List[PropertyRule] = [
+    PropertyRule("employment", "P108", "organization", limit=1,
+                 qualifiers=(("P580", "start_year", "year"), ("P582", "end_year", "year"))),
+    PropertyRule("education", "P69", "organization", qualifiers=(("P580", "start_year", "year"),)),
+    PropertyRule("works", "P800", "title"),
+    PropertyRule("peer_reviews", "P4032", "organization", qualifiers=(("P236", "issn", "string"),),
+                 order=("completion_year", True)),
+    PropertyRule("funding", "P8324", "organization", qualifiers=(("P580", "start_year", "year"),)),
+    PropertyRule("memberships", "P463", "organization",
+                 qualifiers=(("P580", "start_year", "year"), ("P582", "end_year", "year"))),
+]
+#%%
+"""
+Compiles one rule into an emitter: fact, reference suffix → QuickStatements line (or None without value).
+Attribute getters, formats and the property prefix are resolved here, once, not per fact.
+"""
+
+def _compile_rule(rule: PropertyRule) -> Callable[[object, str], Optional[str]]:
+    if rule.fmt not in FORMATS or any(fmt not in FORMATS for _, _, fmt in rule.qualifiers):
+        raise ValueError(f"Unknown value format in rule {rule.section} → {rule.prop}")
+
+    get_value, fmt_value = attrgetter(rule.value), FORMATS[rule.fmt]
+    qualifiers = [(f"|{prop}|", attrgetter(attr), FORMATS[fmt]) for prop, attr, fmt in rule.qualifiers]
+    prefix = f"LAST|{rule.prop}|"
+    with_refs = rule.references
+
+    def emit(fact, refs: str) -> Optional[str]:
+        value = get_value(fact)
+        if not value:
+            return None
+        line = prefix + fmt_value(value)
+        for head, get, fmt in qualifiers:
+            q = get(fact)
+            if q:
+                line += head + fmt(q)
+        return line + refs if with_refs else line
+
+    return emit
+
+
+"""
+Compiled form of a spec: one entry per section with its limit, sort order and the emitters of all its rules.
+"""
+
+class CompiledMapping:
+    __slots__ = ("sections", "names")
+
+    def __init__(self, sections: List[Tuple[str, Callable, int, Optional[Callable], List[Callable]]]):
+        self.sections = sections
+        self.names = frozenset(section for section, *_ in sections)
+
+    # Rejects limits for sections the spec does not map (e.g. a misspelled "peer_review")
+    def _check_limits(self, limits: Dict[str, int]):
+        unknown = set(limits) - self.names
+        if unknown:
+            raise ValueError(f"Unknown sections in limits: {', '.join(sorted(unknown))}")
+
+    """
+    Returns the sections that are exported with the given `limits`, i.e. whose limit is not zero.
+    Sections outside this set do not need to be fetched.
+    """
+
+    def active_sections(self, limits: Optional[Dict[str, int]] = None) -> List[str]:
+        if limits is not None:
+            self._check_limits(limits)
+        return [section for section, _, limit, _, _ in self.sections
+                if (limits or {}).get(section, limit) > 0]
+
+    """
+    Returns the QuickStatements lines of one researcher (one pass over each section).
+    `limits` (section → n) overrides the limits of the spec; unknown sections raise a ValueError.
+    """
+
+    def lines(self, researcher, source_url: str, retrieved: str, limits: Optional[Dict[str, int]] = None) -> List[str]:
+        if limits is not None:
+            self._check_limits(limits)
+        refs = f'|S854|"{source_url}"|S813|{retrieved}'
+        out = []
+        for section, get_facts, limit, sort_key, emitters in self.sections:
+            if limits is not None:
+                limit = limits.get(section, limit)
+            facts = get_facts(researcher)
+            if sort_key is not None:
+                facts = sort_key(facts)
+            for fact in facts[:limit]:
+                for emit in emitters:
+                    line = emit(fact, refs)
+                    if line:
+                        out.append(line)
+        return out
+
+
+"""
+Compiles a spec (list of rules) into a `CompiledMapping`. Rules of the same section share one pass over its facts,
+so they must agree on limit and order.
+"""
+
+def compile_spec(spec: List[PropertyRule]) -> CompiledMapping:
+    grouped: Dict[str, List[PropertyRule]] = {}
+    for rule in spec:
+        grouped.setdefault(rule.section, []).append(rule)
+
+    sections = []
+    for section, rules in grouped.items():
+        first = rules[0]
+        if any(r.limit != first.limit or r.order != first.order for r in rules):
+            raise ValueError(f"Rules of section '{section}' disagree on limit or order")
+
+        sort_key = None
+        if first.order:
+            attr, descending = first.order
+            get = attrgetter(attr)
+            # Missing values go last in either direction
+            missing = 0 if descending else float("inf")
+
+            def sort_key(facts, get=get, descending=descending, missing=missing):
+                return sorted(facts, key=lambda f: get(f) or missing, reverse=descending)
+
+        sections.append((section, attrgetter(section), first.limit, sort_key, [_compile_rule(r) for r in rules]))
+
+    return CompiledMapping(sections)
+
+
+# Mapping compiled from the default spec
+DEFAULT_MAPPING = compile_spec(SPEC)
+#%%
+# Test call
+# from orcid_records import Researcher, EducationFact, PeerReviewFact
+# r = Researcher("0000-0002-1481-2996", education=[EducationFact("TH Köln", 2019)],
+#                peer_reviews=[PeerReviewFact("Journal A", "1234-5678", 2020)])
+# print(DEFAULT_MAPPING.lines(r, "https://orcid.org/0000-0002-1481-2996", "+2025-06-30T00:00:00Z/11"))
@@ -1,10 +1,16 @@
 #%%
 # Necessary imports
-import argparse, csv, logging, time, urllib.parse
-import orjson, pandas as pd, requests
 from __future__ import annotations
+import argparse, csv, logging, sys, time, urllib.parse
+import orjson, pandas as pd, requests
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 from SPARQLWrapper import SPARQLWrapper, JSON
+
+from orcid_index import OrcidIndex
+from profiling import profile_session, network_wait
+from sharding import Shard, parse_shard, in_shard, shard_key, shard_path, shard_files, \
+    journal_path, load_journal, append_journal, merge_csv, roster_row_key, roster_sort_key
 #%%
 # Base URL for ORCID API v3.0
 ORCID_BASE = "https://pub.orcid.org/v3.0"
@@ -19,6 +25,12 @@ OUT_FILE   = BASE_DIR / "import" / "input_with_orcid.csv"
 
 # Seconds between API calls
 RATE_SLEEP = 0.25
+
+# Number of processes/hosts sharing the ORCID rate limit (set by `run`)
+RATE_SHARE = 1
+
+# Optional offline index built from the ORCID public data file (see orcid_index.py, set by `run`)
+ORCID_INDEX: OrcidIndex | None = None
 #%%
 """
 Performs an HTTP GET request to the specified URL and returns the response as JSON.
@@ -30,8 +42,9 @@ def _get_json(url: str) -> dict:
     # Retry up to three times on errors
     for attempt in range(3):
         try:
-            # Perform HTTP GET with set headers and timeout
-            r = requests.get(url, headers=HEADERS, timeout=20)
+            # Perform HTTP GET with set headers and timeout (reported as network wait when profiling)
+            with network_wait():
+                r = requests.get(url, headers=HEADERS, timeout=20)
 
             # Raises an exception for HTTP error codes (4xx, 5xx)
             r.raise_for_status()
@@ -54,6 +67,10 @@ Strategy:
     1. Search with given name and family name.
     2. If an organization (`org`) is provided, perform a second attempt with an affiliation filter.
 
+If an offline index (`ORCID_INDEX`) is loaded, both steps are first answered locally. If the index knows no
+candidate at all, the live API is only asked for records modified after the dump date (records the index cannot
+know about). If the name is ambiguous in the index, the unrestricted live query is used.
+
 The function returns the first found ORCID iD or `None` if no matches are found.
 """
 
@@ -62,13 +79,30 @@ def orcid_search(given: str, family: str, org: str | None = None, debug: bool =
     if not family:
         return None
 
+    # Local lookup in the offline index – only unambiguous matches are accepted
+    changed_since = ""
+    if ORCID_INDEX is not None:
+        found = ORCID_INDEX.candidates(given, family)
+        if len(found) > 1 and org:
+            # Ambiguous name → try to disambiguate by affiliation
+            found = ORCID_INDEX.candidates(given, family, org) or found
+        if debug:
+            print("📚 Index candidates:", found)
+        if len(found) == 1:
+            return found[0]
+
+        # Unknown to the index → only records changed after the dump can match;
+        # ambiguous names fall through to the unrestricted live query
+        if not found and ORCID_INDEX.dump_date:
+            changed_since = f' AND profile-last-modified-date:[{ORCID_INDEX.dump_date}T00:00:00Z TO *]'
+
     # Build base query: given name + family name
     base_q = f'given-names:"{given}"+AND+family-name:"{family}"'
-    queries = [base_q]
+    queries = [base_q + changed_since]
 
     # If organization is given, extend the search query
     if org:
-        queries.append(f'{base_q} AND affiliation-org-name:"{org}"')
+        queries.append(f'{base_q} AND affiliation-org-name:"{org}"{changed_since}')
 
     # Try each defined query in sequence
     for q in queries:
@@ -99,8 +133,8 @@ def orcid_search(given: str, family: str, org: str | None = None, debug: bool =
         if debug:
             print("  ↳ result count:", len(hits or []))
 
-        # Wait to reduce API load
-        time.sleep(RATE_SLEEP)
+        # Wait to reduce API load (longer if the rate limit is shared)
+        time.sleep(RATE_SLEEP * RATE_SHARE)
 
         # Return ORCID iD of the first hit
         if hits:
@@ -132,7 +166,8 @@ def scholia_orcid(full_name: str) -> str | None:
 
     try:
         # Execute query and extract result
-        res = sparql.query().convert()["results"]["bindings"]
+        with network_wait():
+            res = sparql.query().convert()["results"]["bindings"]
 
         # Return ORCID iD if a hit is found
         return res[0]["orcid"]["value"] if res else None
@@ -148,55 +183,127 @@ Performs ORCID enrichment for an Excel list of people.
 
 For each person (name + institution), attempts to find a matching ORCID iD via the ORCID API or Wikidata.
 The results are exported to a CSV file.
+
+With a shard ("i/N"), only the rows hashed to that shard are processed and written to a per-shard CSV.
+Every finished row is recorded in the shard's journal, so a restarted shard continues where it stopped.
+The journal is removed after the CSV is written, so a later sync searches every row again.
+`rate_share` is the number of processes/hosts sharing the ORCID rate limit; each one sleeps proportionally longer.
+With `profile` (report path), the stages load/search/write are profiled and a report is written (see `profiling.py`).
+With `index` (path of an index built by `orcid_index.py`), ORCID searches are answered locally where possible.
 """
 
 # limit (int | None, optional): Number of people to process (for testing or debugging).
 DEFAULT_LIMIT = 5
 
-def run(limit: int | None = DEFAULT_LIMIT):
-    logging.info("📥  Loading staff list …")
+def run(limit: int | None = DEFAULT_LIMIT, shard: Shard | None = None, rate_share: int = 1,
+        profile: str | None = None, index: str | None = None):
+    global RATE_SHARE, ORCID_INDEX
+
+    # Scale the pause between API calls to this process' share of the rate limit
+    RATE_SHARE = max(rate_share, 1)
+
+    # Open the offline ORCID index (each process opens its own connection)
+    if index:
+        ORCID_INDEX = OrcidIndex(index)
+        logging.info("📚  Using ORCID index %s (dump %s)", index, ORCID_INDEX.dump_date)
+
+    # Optional profiling session (one report per shard)
+    with profile_session(shard_path(profile, shard) if profile else None) as prof:
+        with prof.stage("load"):
+            logging.info("📥  Loading staff list …")
+
+            # Read input file (Excel)
+            df = pd.read_excel(DATA_FILE)
+
+            # Per-shard output file and journal of already processed rows
+            out_file = shard_path(OUT_FILE, shard)
+            journal = journal_path(out_file)
+            done = load_journal(journal)
 
-    # Read input file (Excel)
-    df = pd.read_excel(DATA_FILE)
+        with prof.stage("search"):
+            # Result rows for CSV output
+            rows = []
 
-    # Result rows for CSV output
-    rows = []
+            for idx, r in enumerate(df.itertuples(index=False), start=1):
 
-    for idx, r in enumerate(df.itertuples(index=False), start=1):
+                # Stop processing after 'limit' entries
+                if limit and idx > limit:
+                    break
 
-        # Stop processing after 'limit' entries
-        if limit and idx > limit:
-            break
+                # Skip rows that belong to another shard
+                known_orcid = getattr(r, "ORCID", "")
+                known_orcid = known_orcid if pd.notna(known_orcid) else ""
+                if not in_shard(r.Name, known_orcid, shard):
+                    continue
 
-        # Split given and family names
-        parts = str(r.Name).strip().split()
-        given  = parts[0]
-        family = " ".join(parts[1:])
+                # Reuse the result of a previous (interrupted) run of this shard
+                key = shard_key(r.Name, known_orcid)
+                if key in done:
+                    rows.append(done[key])
+                    continue
 
-        logging.info("▶ [%s/%s] %s", idx, len(df), r.Name)
+                # Split given and family names
+                parts = str(r.Name).strip().split()
+                given  = parts[0]
+                family = " ".join(parts[1:])
 
-        # ORCID search via official API, optionally with institution
-        orcid_id = orcid_search(given, family, r.Institution)
+                logging.info("▶ [%s/%s] %s", idx, len(df), r.Name)
 
-        # Fallback: ORCID search via Wikidata (SPARQL)
-        if not orcid_id:
-            orcid_id = scholia_orcid(r.Name)
+                # ORCID search via official API, optionally with institution
+                orcid_id = orcid_search(given, family, r.Institution)
 
-        # Add entry to result list
-        rows.append({
-            "Institution":  r.Institution,
-            "Name":         r.Name,
-            "ORCID":        orcid_id or "",
-            "ORCID-Link":   f"https://orcid.org/{orcid_id}" if orcid_id else ""
-        })
+                # Fallback: ORCID search via Wikidata (SPARQL)
+                if not orcid_id:
+                    orcid_id = scholia_orcid(r.Name)
 
-    logging.info("💾  Writing %s", OUT_FILE)
+                # Add entry to result list and record it in the journal
+                row = {
+                    "Institution":  r.Institution,
+                    "Name":         r.Name,
+                    "ORCID":        orcid_id or "",
+                    "ORCID-Link":   f"https://orcid.org/{orcid_id}" if orcid_id else ""
+                }
+                rows.append(row)
+                append_journal(journal, key, row)
 
-    # Write results to CSV file
-    pd.DataFrame(rows).to_csv(OUT_FILE, index=False, quoting=csv.QUOTE_ALL)
+        with prof.stage("write"):
+            logging.info("💾  Writing %s", out_file)
+
+            # Write results to CSV file
+            pd.DataFrame(rows).to_csv(out_file, index=False, quoting=csv.QUOTE_ALL)
+
+            # The run is complete – drop the journal so the next sync does not reuse stale results
+            journal.unlink(missing_ok=True)
 
     logging.info("✅  Done – %s rows", len(rows))
 
+#%%
+"""
+Merges all per-shard result files into the combined `input_with_orcid.csv`.
+Rows are deduplicated across shards and sorted, so the output is identical for any number of shards.
+"""
+
+def merge_shards():
+    files = shard_files(OUT_FILE)
+    count = merge_csv(files, OUT_FILE, key=roster_row_key, sort_key=roster_sort_key)
+    logging.info("🔗  Merged %s shard files → %s (%s rows)", len(files), OUT_FILE, count)
+
+
+"""
+Runs all shards on the local machine in a process pool and merges the results afterwards.
+The processes share the ORCID rate limit, so each one waits `workers` times longer between calls.
+"""
+
+def run_local(workers: int, limit: int | None = DEFAULT_LIMIT, profile: str | None = None, index: str | None = None):
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(run, limit, (i, workers), workers, profile, index) for i in range(workers)]
+
+        # Propagate errors of any shard
+        for future in futures:
+            future.result()
+
+    merge_shards()
+
 #%%
 if __name__ == "__main__":
 
@@ -206,12 +313,23 @@ if __name__ == "__main__":
     # Parse command-line arguments
     parser = argparse.ArgumentParser()
     parser.add_argument("--limit", type=int, help="Process only N rows")
+    parser.add_argument("--shard", type=parse_shard, help="Process only shard i of N (0-based), e.g. 0/4")
+    parser.add_argument("--rate-share", type=int, default=1, help="Number of processes/hosts sharing the ORCID rate limit")
+    parser.add_argument("--workers", type=int, help="Run N shards in local processes and merge the results")
+    parser.add_argument("--merge", action="store_true", help="Only merge existing shard files")
+    parser.add_argument("--profile", metavar="PATH", help="Profile the run and write a report to PATH.*")
+    parser.add_argument("--index", metavar="PATH", help="Offline ORCID index built by orcid_index.py")
 
     # Read arguments from sys.argv (ignore unknown arguments)
     args, _ = parser.parse_known_args(sys.argv[1:])
 
-    # Start main process with the specified limit
-    run(args.limit)
+    # Start main process with the specified limit (sharded, local pool or merge only)
+    if args.merge:
+        merge_shards()
+    elif args.workers:
+        run_local(args.workers, args.limit, args.profile, args.index)
+    else:
+        run(args.limit, args.shard, args.rate_share, args.profile, args.index)
 
 #%%
 # Test call
@@ -28,8 +28,8 @@
 # Type hints.
 # from typing import Optional, Dict
 
-# Memoization decorator.
-# from functools import lru_cache
+# Thread-safe primitives and futures (used by the memoization in memo.py).
+# threading, concurrent.futures
 
 #%%
 # Libraries that need to be installed additionally
@@ -0,0 +1,224 @@
+#%%
+# Helpers for running the pipeline in shards (multiple processes or machines).
+# A shard is written as "i/N" (0-based index i of N shards). Rows are assigned to shards by a stable hash
+# of name + ORCID, so every host computes the same partition without coordination.
+
+import csv, hashlib, json, re
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+# A shard as (index, count), e.g. (0, 4) for the first of four shards
+Shard = Tuple[int, int]
+#%%
+"""
+Parses a shard specification of the form "i/N" into a tuple (i, N).
+The index is 0-based, i.e. valid shards of "N=4" are 0/4 … 3/4.
+"""
+
+def parse_shard(spec: str) -> Shard:
+    try:
+        index, count = (int(part) for part in spec.split("/", 1))
+    except ValueError:
+        raise ValueError(f"Invalid shard '{spec}' – expected 'i/N', e.g. '0/4'") from None
+
+    # Index must address one of the N shards
+    if count < 1 or not 0 <= index < count:
+        raise ValueError(f"Invalid shard '{spec}' – index must be in 0..{count - 1}")
+    return index, count
+
+
+"""
+Builds the partition key of a row from name and ORCID (whitespace-trimmed, name lowercased).
+The same key is used for deduplication, so duplicates always land in the same shard.
+"""
+
+def shard_key(name: str = "", orcid: str = "") -> str:
+    return f"{str(name or '').strip().lower()}|{str(orcid or '').strip()}"
+
+
+"""
+Returns the shard index (0..count-1) of a row.
+Python's built-in hash() is salted per process, so a fixed digest is used instead.
+"""
+
+def shard_of(name: str, orcid: str, count: int) -> int:
+    digest = hashlib.blake2b(shard_key(name, orcid).encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big") % count
+
+
+"""
+Checks whether a row belongs to the given shard. Without a shard (`None`) every row is processed.
+"""
+
+def in_shard(name: str, orcid: str, shard: Optional[Shard]) -> bool:
+    if shard is None:
+        return True
+    index, count = shard
+    return shard_of(name, orcid, count) == index
+
+
+"""
+Derives the per-shard file name, e.g. `input_with_orcid.csv` → `input_with_orcid.shard-0-of-4.csv`.
+Without a shard the path is returned unchanged.
+"""
+
+def shard_path(path, shard: Optional[Shard]) -> Path:
+    path = Path(path)
+    if shard is None:
+        return path
+    index, count = shard
+    return path.with_name(f"{path.stem}.shard-{index}-of-{count}{path.suffix}")
+
+
+"""
+Lists the shard files belonging to a base output path, ordered by shard index.
+All files must come from one run with the same shard count N and cover every shard 0..N-1;
+leftovers of a run with another N or a missing shard raise a ValueError instead of producing an incomplete merge.
+"""
+
+def shard_files(path) -> List[Path]:
+    path = Path(path)
+    pattern = re.compile(rf"{re.escape(path.stem)}\.shard-(\d+)-of-(\d+){re.escape(path.suffix)}")
+
+    # Group existing shard files by shard count: N → {index: file}
+    by_count: Dict[int, Dict[int, Path]] = {}
+    for file in path.parent.glob(f"{path.stem}.shard-*-of-*{path.suffix}"):
+        match = pattern.fullmatch(file.name)
+        if match:
+            by_count.setdefault(int(match.group(2)), {})[int(match.group(1))] = file
+
+    if not by_count:
+        raise ValueError(f"No shard files found for {path}")
+    if len(by_count) > 1:
+        raise ValueError(f"Shard files of several runs found for {path} (N = {', '.join(map(str, sorted(by_count)))}); "
+                         f"remove the stale ones")
+
+    count, files = next(iter(by_count.items()))
+    missing = [i for i in range(count) if i not in files]
+    if missing:
+        raise ValueError(f"Incomplete shard set for {path}: missing shard(s) {', '.join(f'{i}/{count}' for i in missing)}")
+    return [files[i] for i in range(count)]
+#%%
+"""
+Journal of completed rows for one shard (JSON lines, one object per processed row).
+An interrupted shard can be restarted and skips every row that is already in its journal.
+The journal is deleted once the shard's output is written, so the next regular run searches again.
+"""
+
+def journal_path(out_path) -> Path:
+    out_path = Path(out_path)
+    return out_path.with_name(f"{out_path.stem}.journal.jsonl")
+
+
+def load_journal(path) -> Dict[str, dict]:
+    entries = {}
+    path = Path(path)
+    if not path.exists():
+        return entries
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            # A line cut off by a crash is ignored; the row is simply processed again
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue
+            entries[entry["key"]] = entry["row"]
+    return entries
+
+
+def append_journal(path, key: str, row: dict) -> None:
+    # Append and flush immediately so a crash loses at most the current row
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(json.dumps({"key": key, "row": row}, ensure_ascii=False) + "\n")
+#%%
+"""
+Merges per-shard CSV files into one deterministic CSV.
+Rows are deduplicated across shards by `key(row)` (first occurrence wins) and sorted by `sort_key(row)`
+(default: the deduplication key), so the result does not depend on the number of shards or the order in which they finished.
+"""
+
+def merge_csv(paths: Iterable, out_path, key: Callable[[dict], tuple],
+              sort_key: Optional[Callable[[dict], tuple]] = None) -> int:
+    merged: Dict[tuple, dict] = {}
+    fieldnames: List[str] = []
+
+    for path in paths:
+        with open(path, newline="", encoding="utf-8") as f:
+            reader = csv.DictReader(f)
+            # Keep column order of the first file, append unseen columns of later ones
+            fieldnames += [c for c in reader.fieldnames or [] if c not in fieldnames]
+            for row in reader:
+                merged.setdefault(key(row), row)
+
+    with open(out_path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=fieldnames, quoting=csv.QUOTE_ALL)
+        writer.writeheader()
+        writer.writerows(sorted(merged.values(), key=sort_key or key))
+    return len(merged)
+
+
+"""
+Deduplication key for staff rows (input_with_orcid.csv): the ORCID iD if one was found, otherwise the lowercased name.
+"""
+
+def roster_row_key(row: dict) -> tuple:
+    name = str(row.get("Name") or "").strip().lower()
+    orcid = str(row.get("ORCID") or "").strip()
+    return (name, orcid) if not orcid else ("", orcid)
+
+
+"""
+Sort key for staff rows: alphabetically by name, then ORCID iD.
+"""
+
+def roster_sort_key(row: dict) -> tuple:
+    return str(row.get("Name") or "").strip().lower(), str(row.get("ORCID") or "").strip()
+#%%
+"""
+Splits a QuickStatements file into statement groups.
+A group starts with a non-LAST line (CREATE or a QID) and contains the LAST| lines that follow it.
+"""
+
+def _qs_groups(text: str) -> List[str]:
+    groups: List[List[str]] = []
+    for line in text.splitlines():
+        if not line.strip():
+            continue
+        if line.startswith("LAST|") and groups:
+            groups[-1].append(line)
+        else:
+            groups.append([line])
+    return ["\n".join(g) for g in groups]
+
+
+"""
+Deduplication key of a QS group: new persons are identified by their ORCID (P496), all other groups by their full text.
+"""
+
+def _qs_group_key(group: str) -> str:
+    for line in group.splitlines():
+        if line.startswith("LAST|P496|"):
+            return line.split("|")[2]
+    return group
+
+
+"""
+Merges per-shard QuickStatements files into one deterministic file with cross-shard deduplication.
+Blank lines between groups (as written by `file_to_qs`) are preserved.
+"""
+
+def merge_qs(paths: Iterable, out_path) -> int:
+    merged: Dict[str, str] = {}
+    blank_separated = False
+
+    for path in paths:
+        text = Path(path).read_text(encoding="utf-8")
+        blank_separated = blank_separated or "\n\n" in text
+        for group in _qs_groups(text):
+            merged.setdefault(_qs_group_key(group), group)
+
+    separator = "\n\n" if blank_separated else "\n"
+    with open(out_path, "w", encoding="utf-8") as f:
+        for k in sorted(merged):
+            f.write(merged[k] + separator)
+    return len(merged)
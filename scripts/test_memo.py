@@ -0,0 +1,173 @@
+import asyncio, threading, time
+
+import pytest
+
+import memo
+from memo import SingleFlightCache, memoize
+
+
+# Polls `condition` until it holds (background threads need a moment to register)
+def wait_until(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "condition not reached"
+        time.sleep(0.001)
+
+
+def test_threads_share_one_load():
+    cache = SingleFlightCache()
+    release = threading.Event()
+    calls = []
+
+    def load():
+        calls.append(1)
+        release.wait(2)
+        return "Q42"
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get("k", load))) for _ in range(5)]
+    for t in threads:
+        t.start()
+    wait_until(lambda: cache.coalesced == 4)
+    release.set()
+    for t in threads:
+        t.join()
+
+    assert results == ["Q42"] * 5
+    assert len(calls) == 1
+    assert cache.stats() == {"hits": 0, "misses": 1, "coalesced": 4, "size": 1, "inflight": 0}
+
+
+def test_async_callers_share_one_load():
+    calls = []
+
+    @memoize()
+    async def lookup(orcid):
+        calls.append(orcid)
+        await asyncio.sleep(0.01)
+        return f"Q{orcid}"
+
+    async def main():
+        return await asyncio.gather(*(lookup("1") for _ in range(5)))
+
+    assert asyncio.run(main()) == ["Q1"] * 5
+    assert calls == ["1"]
+    assert lookup.cache_stats()["coalesced"] == 4
+
+
+def test_cancelled_follower_does_not_break_shared_load():
+    cache = SingleFlightCache()
+
+    async def load():
+        await asyncio.sleep(0.1)
+        return "Q42"
+
+    async def main():
+        leader = asyncio.ensure_future(cache.get_async("k", load))
+        await asyncio.sleep(0)
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(cache.get_async("k", load), 0.01)
+        third = asyncio.ensure_future(cache.get_async("k", load))
+        return await leader, await third
+
+    assert asyncio.run(main()) == ("Q42", "Q42")
+    assert cache.stats()["misses"] == 1
+
+
+def test_ttl_expiry(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(memo.time, "monotonic", lambda: now[0])
+    cache = SingleFlightCache(ttl=10)
+    values = iter(["old", "new"])
+
+    assert cache.get("k", lambda: next(values)) == "old"
+    now[0] += 9
+    assert cache.get("k", lambda: next(values)) == "old"
+    now[0] += 2
+    assert cache.get("k", lambda: next(values)) == "new"
+    assert (cache.hits, cache.misses) == (1, 2)
+
+
+def test_lru_eviction():
+    cache = SingleFlightCache(maxsize=2)
+    cache.get("a", lambda: 1)
+    cache.get("b", lambda: 2)
+    cache.get("a", lambda: 1)  # "a" is now the most recently used entry
+    cache.get("c", lambda: 3)  # evicts "b"
+
+    assert cache.get("a", lambda: "reloaded") == 1
+    assert cache.get("b", lambda: "reloaded") == "reloaded"
+    assert cache.stats()["size"] == 2
+
+
+def test_exceptions_are_not_cached():
+    cache = SingleFlightCache()
+
+    def fail():
+        raise ConnectionError("Wikidata unreachable")
+
+    with pytest.raises(ConnectionError):
+        cache.get("k", fail)
+    assert cache.get("k", lambda: "Q42") == "Q42"
+    assert cache.stats() == {"hits": 0, "misses": 2, "coalesced": 0, "size": 1, "inflight": 0}
+
+
+def test_exception_reaches_waiting_threads():
+    cache = SingleFlightCache()
+    release = threading.Event()
+    errors = []
+
+    def load():
+        release.wait(2)
+        raise ConnectionError("Wikidata unreachable")
+
+    def call():
+        try:
+            cache.get("k", load)
+        except ConnectionError as exc:
+            errors.append(exc)
+
+    threads = [threading.Thread(target=call) for _ in range(3)]
+    for t in threads:
+        t.start()
+    wait_until(lambda: cache.coalesced == 2)
+    release.set()
+    for t in threads:
+        t.join()
+
+    assert len(errors) == 3
+    assert cache.stats()["size"] == 0
+
+
+def test_clear_during_load_does_not_store_stale_value():
+    cache = SingleFlightCache()
+    release = threading.Event()
+    result = []
+
+    def load():
+        release.wait(2)
+        return "stale"
+
+    t = threading.Thread(target=lambda: result.append(cache.get("k", load)))
+    t.start()
+    wait_until(lambda: cache.stats()["inflight"] == 1)
+    cache.clear()
+    release.set()
+    t.join()
+
+    assert result == ["stale"]
+    assert cache.get("k", lambda: "fresh") == "fresh"
+
+
+def test_counters_and_clear():
+    @memoize(maxsize=10)
+    def lookup(label, lang="de"):
+        return f"{label}@{lang}"
+
+    lookup("TH Köln")
+    lookup("TH Köln")
+    lookup("TH Köln", lang="en")
+    assert lookup.cache_stats() == {"hits": 1, "misses": 2, "coalesced": 0, "size": 2, "inflight": 0}
+
+    lookup.cache_clear()
+    assert lookup.cache_stats() == {"hits": 0, "misses": 0, "coalesced": 0, "size": 0, "inflight": 0}
@@ -0,0 +1,131 @@
+import pytest
+
+from orcid_records import Researcher, EducationFact, EmploymentFact, MembershipFact, WorkFact, PeerReviewFact, \
+    FundingFact
+from qs_mapping import PropertyRule, DEFAULT_MAPPING, compile_spec
+
+SOURCE = "https://orcid.org/0000-0002-1481-2996"
+RETRIEVED = "+2025-06-30T00:00:00Z/11"
+REFS = f'|S854|"{SOURCE}"|S813|{RETRIEVED}'
+
+
+def lines(researcher, limits=None, mapping=DEFAULT_MAPPING):
+    return mapping.lines(researcher, SOURCE, RETRIEVED, limits)
+
+
+def test_lines_for_each_section():
+    r = Researcher(
+        "0000-0002-1481-2996",
+        employment=[EmploymentFact("TH Köln", 2020, 2024)],
+        education=[EducationFact("Uni Bonn", 2015)],
+        works=[WorkFact("Linked Data in Practice")],
+        peer_reviews=[PeerReviewFact("Journal A", "1234-5678", 2021)],
+        funding=[FundingFact("DFG", 2022)],
+        memberships=[MembershipFact("NFDI4Culture", 2021, 2023)],
+    )
+    assert lines(r) == [
+        'LAST|P108|"TH Köln"|P580|+2020-00-00T00:00:00Z/9|P582|+2024-00-00T00:00:00Z/9' + REFS,
+        'LAST|P69|"Uni Bonn"|P580|+2015-00-00T00:00:00Z/9' + REFS,
+        'LAST|P800|"Linked Data in Practice"' + REFS,
+        'LAST|P4032|"Journal A"|P236|"1234-5678"' + REFS,
+        'LAST|P8324|"DFG"|P580|+2022-00-00T00:00:00Z/9' + REFS,
+        'LAST|P463|"NFDI4Culture"|P580|+2021-00-00T00:00:00Z/9|P582|+2023-00-00T00:00:00Z/9' + REFS,
+    ]
+
+
+def test_empty_qualifiers_are_omitted():
+    r = Researcher(
+        "0000-0002-1481-2996",
+        employment=[EmploymentFact("TH Köln")],
+        peer_reviews=[PeerReviewFact("Journal A")],
+        memberships=[MembershipFact("NFDI4Culture", None, 2023)],
+    )
+    assert lines(r) == [
+        'LAST|P108|"TH Köln"' + REFS,
+        'LAST|P4032|"Journal A"' + REFS,
+        'LAST|P463|"NFDI4Culture"|P582|+2023-00-00T00:00:00Z/9' + REFS,
+    ]
+
+
+def test_facts_without_value_are_skipped():
+    r = Researcher("0000-0002-1481-2996", education=[EducationFact(""), EducationFact("Uni Bonn")])
+    assert lines(r) == ['LAST|P69|"Uni Bonn"' + REFS]
+
+
+def test_limits_from_spec_and_overrides():
+    r = Researcher(
+        "0000-0002-1481-2996",
+        employment=[EmploymentFact("A"), EmploymentFact("B")],
+        works=[WorkFact(f"Work {i}") for i in range(7)],
+    )
+    # Spec: one employment, five works
+    out = lines(r)
+    assert [line for line in out if "|P108|" in line] == ['LAST|P108|"A"' + REFS]
+    assert sum("|P800|" in line for line in out) == 5
+
+    out = lines(r, {"employment": 2, "works": 0})
+    assert sum("|P108|" in line for line in out) == 2
+    assert not any("|P800|" in line for line in out)
+
+
+def test_peer_reviews_newest_first_missing_years_last():
+    r = Researcher("0000-0002-1481-2996", peer_reviews=[
+        PeerReviewFact("Undated"),
+        PeerReviewFact("Old", completion_year=2015),
+        PeerReviewFact("New", completion_year=2023),
+        PeerReviewFact("Middle", completion_year=2019),
+    ])
+    orgs = [line.split("|")[2] for line in lines(r)]
+    assert orgs == ['"New"', '"Middle"', '"Old"', '"Undated"']
+
+    # The limit applies after sorting
+    orgs = [line.split("|")[2] for line in lines(r, {"peer_reviews": 2})]
+    assert orgs == ['"New"', '"Middle"']
+
+
+def test_ascending_order_keeps_missing_values_last():
+    mapping = compile_spec([PropertyRule("peer_reviews", "P4032", "organization",
+                                         order=("completion_year", False))])
+    r = Researcher("0000-0002-1481-2996", peer_reviews=[
+        PeerReviewFact("Undated"), PeerReviewFact("New", completion_year=2023), PeerReviewFact("Old", completion_year=2015),
+    ])
+    orgs = [line.split("|")[2] for line in lines(r, mapping=mapping)]
+    assert orgs == ['"Old"', '"New"', '"Undated"']
+
+
+def test_unknown_limit_section_is_rejected():
+    r = Researcher("0000-0002-1481-2996")
+    with pytest.raises(ValueError, match="peer_review"):
+        lines(r, {"peer_review": 5})
+    with pytest.raises(ValueError, match="Education"):
+        DEFAULT_MAPPING.active_sections({"Education": 5})
+
+
+def test_active_sections_skip_zero_limits():
+    assert DEFAULT_MAPPING.active_sections() == \
+        ["employment", "education", "works", "peer_reviews", "funding", "memberships"]
+    assert DEFAULT_MAPPING.active_sections({"works": 0, "funding": 0}) == \
+        ["employment", "education", "peer_reviews", "memberships"]
+
+
+def test_compile_spec_rejects_disagreeing_limits():
+    with pytest.raises(ValueError, match="disagree"):
+        compile_spec([
+            PropertyRule("education", "P69", "organization", limit=5),
+            PropertyRule("education", "P1026", "organization", limit=3),
+        ])
+
+
+def test_compile_spec_rejects_disagreeing_order():
+    with pytest.raises(ValueError, match="disagree"):
+        compile_spec([
+            PropertyRule("peer_reviews", "P4032", "organization", order=("completion_year", True)),
+            PropertyRule("peer_reviews", "P236", "issn"),
+        ])
+
+
+def test_compile_spec_rejects_unknown_format():
+    with pytest.raises(ValueError, match="Unknown value format"):
+        compile_spec([PropertyRule("education", "P69", "organization", fmt="date")])
+    with pytest.raises(ValueError, match="Unknown value format"):
+        compile_spec([PropertyRule("education", "P69", "organization", qualifiers=(("P580", "start_year", "month"),))])